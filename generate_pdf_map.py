@@ -1,39 +1,149 @@
 import os
-import osmium
+import json
 import time
+import shapely
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 from datetime import datetime
+from reportlab import rl_config
 from reportlab.pdfgen import canvas
+from shapely.geometry import MultiPolygon, Polygon
+from typing import List
 
 from src.logger import logger
 from src.osm_handler import OSMHandler
 from config import CONFIG
 from src.map_dimensions import MapDimensions
+from src.rendering import FeatureRenderer
+from src.project_types import BBox
 
+# Feature layers drawn on top of the coastline and background water, in drawing order
+RENDER_LAYERS = [
+    "render_parks",
+    "render_water_features",
+    "render_buildings",
+    "render_roads",
+]
 
-class PdfMapHandler(OSMHandler):
-    def __init__(self, boundary_relation_id: int | None = None):
-        super().__init__(boundary_relation_id)
-        self.progress: tqdm | None = None
+# Write the compressed content stream as binary, ASCII85 would grow it by a quarter and is slow to encode
+rl_config.useA85 = 0
 
+# Element counts of previously processed PBF files, used as the progress bar total
+ELEMENT_COUNTS_FILE = os.path.join("maps", ".pbf_counts.json")
 
-class CounterHandler(osmium.SimpleHandler):
-    "Counts the number of elements in the OSM file"
 
-    def __init__(self):
-        super().__init__()
-        self.node_count = 0
-        self.way_count = 0
-        self.relation_count = 0
-
-    def way(self, _w):
-        self.way_count += 1
+class PdfMapHandler(OSMHandler):
+    def __init__(
+        self, boundary_relation_id: int | None = None, bbox: BBox | None = None
+    ):
+        super().__init__(boundary_relation_id, bbox)
+        self.progress: tqdm | None = None
 
-    def node(self, _n):
-        self.node_count += 1
 
-    def relation(self, _r):
-        self.relation_count += 1
+def load_element_counts() -> dict:
+    """Cached element counts keyed by absolute PBF path"""
+    try:
+        with open(ELEMENT_COUNTS_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def prefetch_pbf(pbf_file: str) -> None:
+    """Ask the kernel to start reading the PBF into the page cache ahead of the parser"""
+    if not hasattr(os, "posix_fadvise"):
+        return
+
+    fd = os.open(pbf_file, os.O_RDONLY)
+    try:
+        # Advice is per file descriptor and osmium opens its own, but the pages read ahead
+        # for WILLNEED stay in the page cache for it to find
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError as e:
+        logger.warning(f"Failed to prefetch {pbf_file}: {e}")
+    finally:
+        os.close(fd)
+
+
+def get_cached_element_count(pbf_file: str) -> int | None:
+    """Number of ways and relations recorded by a previous run, None if the file changed since"""
+    entry = load_element_counts().get(os.path.abspath(pbf_file))
+    stat = os.stat(pbf_file)
+    if (
+        not entry
+        or entry.get("mtime") != stat.st_mtime
+        or entry.get("size") != stat.st_size
+    ):
+        return None
+    return entry.get("elements")
+
+
+def cache_element_count(pbf_file: str, element_count: int) -> None:
+    """Record the number of ways and relations in a PBF file for the next run"""
+    stat = os.stat(pbf_file)
+    element_counts = load_element_counts()
+    element_counts[os.path.abspath(pbf_file)] = {
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "elements": element_count,
+    }
+    with open(ELEMENT_COUNTS_FILE, "w") as f:
+        json.dump(element_counts, f)
+
+
+# State inherited by forked render workers
+_render_state: (
+    tuple[PdfMapHandler, MapDimensions, Polygon | MultiPolygon | None] | None
+) = None
+
+
+def render_layer_operators(layer: str) -> List[str]:
+    """Render one layer on a scratch canvas and return the PDF operators it produced"""
+    if _render_state is None:
+        raise ValueError("Render state is only available in forked render workers")
+
+    handler, map_dimensions, boundary = _render_state
+    layer_canvas = canvas.Canvas(
+        os.devnull,
+        pagesize=(map_dimensions.width_points, map_dimensions.height_points),
+    )
+    getattr(handler, layer)(FeatureRenderer(layer_canvas, map_dimensions, boundary))
+    return layer_canvas._code
+
+
+def render_layers(
+    handler: PdfMapHandler,
+    c: canvas.Canvas,
+    map_dimensions: MapDimensions,
+    boundary: Polygon | MultiPolygon | None,
+) -> None:
+    """
+    Render the feature layers, in parallel worker processes when there are spare cores and the platform can fork
+
+    Each worker draws one layer on its own canvas and the resulting operators are appended to the
+    page in layer order, so the PDF is the same as drawing the layers one after another.
+    """
+    max_workers = min(len(RENDER_LAYERS), os.cpu_count() or 1)
+    if max_workers < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        # One renderer, and its boundary bbox, is shared by every layer
+        renderer = FeatureRenderer(c, map_dimensions, boundary)
+        for layer in RENDER_LAYERS:
+            getattr(handler, layer)(renderer)
+        return
+
+    global _render_state
+    _render_state = (handler, map_dimensions, boundary)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("fork"),
+        ) as executor:
+            for layer_operators in executor.map(render_layer_operators, RENDER_LAYERS):
+                c._code.extend(layer_operators)
+    finally:
+        _render_state = None
 
 
 def main():
@@ -50,49 +160,42 @@ def main():
     output_path = os.path.join("maps", f"pdf_map_{timestamp}.pdf")
     os.makedirs("maps", exist_ok=True)
 
-    # Count the number of elements in the OSM file
-    logger.info("Counting elements in the OSM file...")
-    counter = CounterHandler()
-    counter.apply_file(CONFIG.pbf_file)
-    logger.info(
-        f"Found {counter.node_count} nodes, {counter.way_count} ways, and {counter.relation_count} relations"
-    )
-
-    handler = PdfMapHandler(CONFIG.boundary_relation_id)
+    handler = PdfMapHandler(CONFIG.boundary_relation_id, map_dimensions.bbox)
 
-    # First pass
-    logger.info("First pass: identifying needed nodes...")
-    handler.progress = tqdm(
-        total=counter.way_count + counter.node_count,
-        desc="Processing OSM data (Pass 1)",
-    )
-    handler.apply_file(CONFIG.pbf_file)
-    handler.progress.close()
+    # Single pass, osmium keeps an index of node locations so ways arrive with their coordinates.
+    # apply_file takes a quick look at the relations first to know which ways relations will need
+    prefetch_pbf(CONFIG.pbf_file)
 
-    # Second pass
-    logger.info("Second pass: processing features...")
-    handler.pass_num = 2
+    logger.info("Processing OSM data...")
     handler.progress = tqdm(
-        total=counter.way_count + counter.node_count,
-        desc="Processing OSM data (Pass 2)",
+        total=get_cached_element_count(CONFIG.pbf_file), desc="Processing OSM data"
     )
-    handler.apply_file(CONFIG.pbf_file)
+    handler.apply_file(CONFIG.pbf_file, locations=True)
+    handler.flush_progress()
+    cache_element_count(CONFIG.pbf_file, handler.progress.n)
     handler.progress.close()
 
     logger.info(f"Found {len(handler.coastlines)} coastline segments")
 
     boundary_polygon = handler.get_boundary_polygon()
 
+    # Features are only tested against the boundary, simplifying it below the size of a point
+    # doesn't change the output. Preparing it lets GEOS index its edges once for every test
+    render_boundary: Polygon | MultiPolygon | None = None
+    if boundary_polygon:
+        render_boundary = boundary_polygon.simplify(
+            map_dimensions.pixel_world_size, preserve_topology=True
+        )
+        shapely.prepare(render_boundary)
+
     c = canvas.Canvas(
         output_path,
         pagesize=(map_dimensions.width_points, map_dimensions.height_points),
+        pageCompression=1,
     )
 
     handler.render_coastline_and_background_water(c, map_dimensions)
-    handler.render_parks(c, map_dimensions, boundary_polygon)
-    handler.render_water_features(c, map_dimensions, boundary_polygon)
-    handler.render_buildings(c, map_dimensions, boundary_polygon)
-    handler.render_roads(c, map_dimensions, boundary_polygon)
+    render_layers(handler, c, map_dimensions, render_boundary)
 
     c.save()
 
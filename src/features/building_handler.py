@@ -1,42 +1,43 @@
-from src.rendering import FeatureRenderer, FeaturePolygonData, PolygonStyle
+from src.rendering import FeatureRenderer, PolygonStyle
+from src.polygon_store import PolygonStore
 
 from reportlab.lib.colors import Color
-from reportlab.pdfgen import canvas
-from shapely.geometry import Polygon, MultiPolygon
 from osmium import osm
 from typing import List, Tuple, Dict
-from src.map_dimensions import MapDimensions
-from src.transforms import transform_relation_to_rings_and_holes
-
+from src.transforms import (
+    transform_relation_to_rings_and_holes,
+    coords_intersect_bbox,
+    bboxes_intersect,
+    relation_members_bbox,
+)
+from src.project_types import BBox
 
 BUILDING_STYLE: PolygonStyle = {
     "fill_color": Color(0.85, 0.85, 0.85),
 }
 
+UNDERGROUND_LOCATIONS = frozenset(("underground",))
+
 
 class BuildingHandler:
+    buildings: PolygonStore
+    bbox: BBox | None
+
     def __init__(self):
         super().__init__()
-        if not hasattr(self, "buildings"):
-            self.buildings: List[FeaturePolygonData] = []
+        self.buildings = PolygonStore()
+        self.bbox = None
 
     def process_way_building(
         self, way: osm.Way, coords: List[Tuple[float, float]]
     ) -> bool:
         """Process a way to possibly add it to the building list"""
-        has_building_tag = bool(way.tags.get("building", None))
-        is_not_underground = way.tags.get("location", None) not in ["underground"]
-
-        if has_building_tag and is_not_underground:
-            self.buildings.append(
-                {
-                    "type": "building_polygon",
-                    "exterior": coords,
-                    "interiors": [],
-                    "name": None,
-                    "relation_id": None,
-                }
-            )
+        # Most ways aren't buildings, so the location tag is only read for the ones that are
+        tags = way.tags
+        if tags.get("building") and tags.get("location") not in UNDERGROUND_LOCATIONS:
+            # Buildings outside of the map are still claimed so no other feature handler picks them up
+            if self.bbox is None or coords_intersect_bbox(coords, self.bbox):
+                self.buildings.add(coords)
             return True
 
         return False
@@ -46,26 +47,25 @@ class BuildingHandler:
     ) -> bool:
         """Process a relation to possibly add it to the building list"""
         if bool(relation.tags.get("building", None)):
+            # Every ring is made of member ways, skip stitching them when they are all outside of the map
+            if self.bbox is not None:
+                members_bbox = relation_members_bbox(relation, way_coords)
+                if members_bbox is None or not bboxes_intersect(
+                    members_bbox, self.bbox
+                ):
+                    return True
+
             for ring, holes in transform_relation_to_rings_and_holes(
                 relation, way_coords
             ):
-                self.buildings.append(
-                    {
-                        "type": "building_polygon",
-                        "exterior": ring,
-                        "interiors": holes,
-                        "name": relation.tags.get("name"),
-                        "relation_id": relation.id,
-                    }
-                )
+                if self.bbox is None or coords_intersect_bbox(ring, self.bbox):
+                    self.buildings.add(
+                        ring, holes, relation.tags.get("name"), relation.id
+                    )
             return True
 
         return False
 
-    def relation_tag_is_building(self, tag: osm.Tag) -> bool:
-        """Check if relation is a building"""
-        return tag.k == "building" and tag.v not in ["no", "false"]
-
     def add_building_relation(
         self,
         relation_name: str,
@@ -73,25 +73,24 @@ class BuildingHandler:
         holes: List[List[Tuple[float, float]]],
         relation_id: int,
     ) -> None:
-        self.buildings.append(
-            {
-                "type": "building_polygon",
-                "exterior": ring,
-                "interiors": holes,
-                "name": relation_name,
-                "relation_id": relation_id,
-            }
-        )
+        self.buildings.add(ring, holes, relation_name, relation_id)
 
     def render_buildings(
         self,
-        c: canvas.Canvas,
-        map_dimensions: MapDimensions,
-        boundary: Polygon | MultiPolygon | None,
+        renderer: FeatureRenderer,
     ) -> None:
-        renderer = FeatureRenderer(c, map_dimensions, boundary)
-        renderer.render_polygon_features(
-            features=self.buildings,
+        self.buildings.finalize()
+
+        # The spatial index query already tests each building against the boundary,
+        # so the renderer only needs the cheap bbox check
+        candidates = (
+            self.buildings.query(renderer.boundary) if renderer.boundary else None
+        )
+
+        renderer.render_polygon_store(
+            store=self.buildings,
             style=BUILDING_STYLE,
             desc="Rendering buildings",
+            indices=candidates,
+            clip_to_boundary=False,
         )
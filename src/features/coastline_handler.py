@@ -1,22 +1,29 @@
-import uuid
+import itertools
+import numpy as np
 from tqdm import tqdm
 from reportlab.lib.colors import Color
 from src.logger import logger
-from typing import List, TypedDict, Dict, Optional, Literal, Tuple
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Dict, Optional, Literal, Tuple
 from src.project_types import Coord, Line
 from src.map_dimensions import Side, MapDimensions
+from src.transforms import bboxes_intersect, bbox_contains
+from src.rendering import BulkPathObject, format_pdf_points
 
 WATER_COLOR = Color(0.529, 0.808, 0.922)
 LAND_COLOR = Color(0.95, 0.95, 0.95)
 
 
-class Coastline(TypedDict):
+@dataclass(slots=True)
+class Coastline:
     id: int
     coords: List[Coord]
     refs: List[int]
 
 
-class CoastlineSection(TypedDict):
+@dataclass(slots=True)
+class CoastlineSection:
     """
     A section of coastline that can be joined with other sections to form a continuous coastline
     """
@@ -28,6 +35,9 @@ class CoastlineSection(TypedDict):
     used: bool
 
 
+# Sides in the order their boundary crossings are computed
+SIDES_CLOCKWISE = (Side.TOP, Side.RIGHT, Side.BOTTOM, Side.LEFT)
+
 # For traversing the map boundary clockwise
 NEXT_SIDE_MAP = {
     Side.TOP: Side.RIGHT,
@@ -37,57 +47,92 @@ NEXT_SIDE_MAP = {
 }
 
 
-class Intersection(TypedDict):
+@dataclass(slots=True)
+class Intersection:
     point: Coord
     is_entering: bool
     side: Side
 
 
+@dataclass(slots=True)
 class IntersectionWithId(Intersection):
-    bounded_coastline_id: str
+    bounded_coastline_id: int
 
 
 IntersectionMap = Dict[Side, List[IntersectionWithId]]
 
-EMPTY_INTERSECTION_MAP: IntersectionMap = {
-    Side.TOP: [],
-    Side.RIGHT: [],
-    Side.BOTTOM: [],
-    Side.LEFT: [],
-}
+
+def create_empty_intersection_map() -> IntersectionMap:
+    """Create an intersection map with a new empty list for each side"""
+    return {
+        Side.TOP: [],
+        Side.RIGHT: [],
+        Side.BOTTOM: [],
+        Side.LEFT: [],
+    }
+
+
+def sort_intersections(
+    intersections: List[IntersectionWithId], axis: int, reverse: bool = False
+) -> List[IntersectionWithId]:
+    """
+    Stable sort of intersections by one coordinate of their point, with a NumPy argsort
+
+    Args:
+        intersections: Intersections to sort
+        axis: 0 to sort by longitude, 1 by latitude
+        reverse: Sort in descending order, equal points keep their order like list.sort(reverse=True)
+    """
+    if len(intersections) < 2:
+        return intersections
+
+    keys = np.fromiter(
+        (intersection.point[axis] for intersection in intersections),
+        dtype=np.float64,
+        count=len(intersections),
+    )
+    order = np.argsort(-keys if reverse else keys, kind="stable")
+    return [intersections[index] for index in order.tolist()]
+
+
+# Position of a coastline segment relative to the map boundaries
+SEGMENT_OUTSIDE = 0
+SEGMENT_INSIDE = 1
+SEGMENT_CROSSING = 2
+
+
+# IDs only need to be unique within a run
+_bounded_coastline_ids = itertools.count()
 
 
-def generate_bounded_coastline_id() -> str:
+def generate_bounded_coastline_id() -> int:
     """Generate a unique ID for a bounded coastline"""
-    return str(uuid.uuid4())
+    return next(_bounded_coastline_ids)
 
 
 class CoastlineHandler:
+    coastlines: List[Coastline]
+
     def __init__(self):
         super().__init__()
-        if not hasattr(self, "coastline"):
-            self.coastlines: List[Coastline] = []
+        self.coastlines = []
 
     def test_way_for_coastline(self, way):
-        for tag in way.tags:
-            if tag.k == "natural" and tag.v == "coastline":
-                return True
-        return False
+        return way.tags.get("natural") == "coastline"
 
     def process_way_coastline(self, way, coords):
-        for tag in way.tags:
-            if tag.k == "natural" and tag.v == "coastline":
-                self.add_coastline(way, coords)
-                return True
+        if self.test_way_for_coastline(way):
+            self.add_coastline(way, coords)
+            return True
         return False
 
     def add_coastline(self, way, coords):
         self.coastlines.append(
-            {
-                "id": way.id,
-                "coords": coords,
-                "refs": [n.ref for n in way.nodes],
-            }
+            Coastline(
+                id=way.id,
+                coords=coords,
+                refs=[n.ref for n in way.nodes],
+            )
         )
 
     def render_coastline_and_background_water(
@@ -137,40 +182,41 @@ class CoastlineHandler:
 
         logger.info(f"Total land masses to draw: {len(all_coastlines)}")
 
-        for coastline in tqdm(all_coastlines, desc="Drawing coastline chains"):
+        # The bars refresh at most ~100 times, most chains take far less time than a redraw
+        for coastline in tqdm(
+            all_coastlines,
+            desc="Drawing coastline chains",
+            mininterval=0.5,
+            miniters=max(1, len(all_coastlines) // 100),
+        ):
             if len(coastline) < 2:
                 continue
 
-            path = c.beginPath()
-
-            # Get first point
-            first_lon, first_lat = coastline[0]
-            first_x, first_y = map_dimensions.transform_coords(first_lon, first_lat)
-            path.moveTo(first_x, first_y)
-
-            # Add all remaining points
-            for lon, lat in coastline[1:]:
-                x, y = map_dimensions.transform_coords(lon, lat)
-                path.lineTo(x, y)
+            # Transform the whole chain at once
+            xs, ys = map_dimensions.transform_coords_batch(
+                np.asarray(coastline, dtype=np.float64)
+            )
 
             # Check if the chain is closed
             is_closed = len(coastline) > 3 and coastline[0] == coastline[-1]
 
             # If the chain is closed, fill it with land color
             if is_closed:
-                path.close()
+                # The whole chain goes into the path in one call instead of a lineTo per vertex
+                path = BulkPathObject()
+                path.addRing(format_pdf_points(xs, ys))
                 c.setFillColor(LAND_COLOR)
                 c.drawPath(path, fill=1, stroke=0)
             else:
                 # Mark endpoints of open chains
                 # Start point in blue
+                first_x, first_y = float(xs[0]), float(ys[0])
                 c.setFillColorRGB(0.0, 0.0, 1.0)  # Blue
                 c.setStrokeColorRGB(0.0, 0.0, 1.0)  # Blue outline
                 c.circle(first_x, first_y, 5, fill=1, stroke=1)
 
                 # End point in red
-                last_lon, last_lat = coastline[-1]
-                last_x, last_y = map_dimensions.transform_coords(last_lon, last_lat)
+                last_x, last_y = float(xs[-1]), float(ys[-1])
                 c.setFillColorRGB(1.0, 0.0, 0.0)  # Red
                 c.setStrokeColorRGB(1.0, 0.0, 0.0)  # Red outline
                 c.circle(last_x, last_y, 5, fill=1, stroke=1)
@@ -178,12 +224,33 @@ class CoastlineHandler:
                 # Reset colors for next segment
                 c.setStrokeColorRGB(0.3, 0.3, 0.3)  # Dark gray outline
 
-    def is_inside_map(self, point: Coord, map_dimensions: MapDimensions) -> bool:
-        """Check if a point is inside the map boundaries"""
-        lon, lat = point
-        return (
-            map_dimensions.min_lon <= lon <= map_dimensions.max_lon
-            and map_dimensions.min_lat <= lat <= map_dimensions.max_lat
+    def classify_segments(
+        self, coords: np.ndarray, map_dimensions: MapDimensions
+    ) -> np.ndarray:
+        """
+        Classify every segment of a line against the map boundaries at once
+
+        Args:
+            coords: (N, 2) array of the line's lon/lat coordinates
+
+        Returns:
+            SEGMENT_INSIDE, SEGMENT_OUTSIDE or SEGMENT_CROSSING for each of the N - 1 segments
+        """
+        lons = coords[:, 0]
+        lats = coords[:, 1]
+        # Points on the map boundaries count as inside
+        inside = (
+            (map_dimensions.min_lon <= lons)
+            & (lons <= map_dimensions.max_lon)
+            & (map_dimensions.min_lat <= lats)
+            & (lats <= map_dimensions.max_lat)
+        )
+        starts_inside = inside[:-1]
+        ends_inside = inside[1:]
+        return np.where(
+            starts_inside & ends_inside,
+            SEGMENT_INSIDE,
+            np.where(starts_inside | ends_inside, SEGMENT_CROSSING, SEGMENT_OUTSIDE),
         )
 
     def convert_coastline_ways_into_continuous_lines(self) -> List[Line]:
@@ -195,19 +262,19 @@ class CoastlineHandler:
         """
         sections: Dict[int, CoastlineSection] = {}
         for coast in self.coastlines:
-            sections[coast["id"]] = {
-                "id": coast["id"],
-                "coords": coast["coords"],
-                "start": coast["refs"][0],
-                "end": coast["refs"][-1],
-                "used": False,
-            }
+            sections[coast.id] = CoastlineSection(
+                id=coast.id,
+                coords=coast.coords,
+                start=coast.refs[0],
+                end=coast.refs[-1],
+                used=False,
+            )
 
         # Start with the longest section as it's likely part of the main coastline
         longest_section = None
         longest_length = 0
         for section in sections.values():
-            length = len(section["coords"])
+            length = len(section.coords)
             if length > longest_length:
                 longest_length = length
                 longest_section = section
@@ -215,167 +282,180 @@ class CoastlineHandler:
         if not longest_section:
             return []
 
+        # Index the sections by their end node refs so chains are extended with lookups
+        # instead of scanning every section, ties go to the earliest section like a scan would
+        section_order = {section_id: index for index, section_id in enumerate(sections)}
+        sections_by_start: Dict[int, List[int]] = {}
+        sections_by_end: Dict[int, List[int]] = {}
+        for section_id, section in sections.items():
+            sections_by_start.setdefault(section.start, []).append(section_id)
+            sections_by_end.setdefault(section.end, []).append(section_id)
+
+        def first_unused(section_ids: List[int]) -> Optional[int]:
+            for section_id in section_ids:
+                if not sections[section_id].used:
+                    return section_id
+            return None
+
         # Create chains of sections
         chains: List[Line] = []
-        current_chain = list(longest_section["coords"])
-        sections[longest_section["id"]]["used"] = True
+        # A deque so sections can be prepended without copying the chain
+        current_chain: Deque[Coord] = deque(longest_section.coords)
+        sections[longest_section.id].used = True
 
         # Keep track of the endpoints of the current chain
-        chain_start = longest_section["start"]
-        chain_end = longest_section["end"]
+        chain_start = longest_section.start
+        chain_end = longest_section.end
+
+        # Sections in insertion order, for picking the start of the next chain
+        section_ids = list(sections)
+        next_start_index = 0
 
         # Try to extend the chain in both directions
         while True:
-            extended = False
+            # Because all coastlines are ordered, we don't need to check start against start or end against end
+            append_id = first_unused(sections_by_start.get(chain_end, []))
+            prepend_id = first_unused(sections_by_end.get(chain_start, []))
+
+            if append_id is not None and (
+                prepend_id is None
+                or section_order[append_id] <= section_order[prepend_id]
+            ):
+                # Connect to end of chain
+                section = sections[append_id]
+                current_chain.extend(section.coords[1:])
+                chain_end = section.end
+                section.used = True
+                continue
+            elif prepend_id is not None:
+                # Connect to start of chain
+                section = sections[prepend_id]
+                # The section ends on the chain's first point
+                current_chain.extendleft(reversed(section.coords[:-1]))
+                chain_start = section.start
+                section.used = True
+                continue
 
-            for section_id, section in list(sections.items()):
-                if section["used"]:
-                    continue
+            if len(current_chain) >= 2:
+                chains.append(list(current_chain))
 
-                # Because all coastlines are ordered, we don't need to check start against start or end against end
-                if section["start"] == chain_end:
-                    # Connect to end of chain
-                    current_chain.extend(section["coords"][1:])
-                    chain_end = section["end"]
-                    sections[section_id]["used"] = True
-                    extended = True
-                    break
-                elif section["end"] == chain_start:
-                    # Connect to start of chain
-                    current_chain = section["coords"] + current_chain[1:]
-                    chain_start = section["start"]
-                    sections[section_id]["used"] = True
-                    extended = True
-                    break
-
-            if not extended:
-                if len(current_chain) >= 2:
-                    chains.append(current_chain)
-
-                # Look for unused sections to start a new chain
-                new_start: Optional[CoastlineSection] = None
-                for section in sections.values():
-                    if not section["used"]:
-                        new_start = section
-                        break
-
-                if new_start is None:
-                    break
-
-                current_chain = list(new_start["coords"])
-                chain_start = new_start["start"]
-                chain_end = new_start["end"]
-                sections[new_start["id"]]["used"] = True
+            # Look for unused sections to start a new chain
+            while (
+                next_start_index < len(section_ids)
+                and sections[section_ids[next_start_index]].used
+            ):
+                next_start_index += 1
+
+            if next_start_index == len(section_ids):
+                break
+
+            new_start = sections[section_ids[next_start_index]]
+            current_chain = deque(new_start.coords)
+            chain_start = new_start.start
+            chain_end = new_start.end
+            new_start.used = True
 
         logger.info(f"Created {len(chains)} coastline chains")
         return chains
 
-    def find_segment_intersection_with_boundary(
+    def find_boundary_crossings(
         self,
-        p1: Coord,
-        p2: Coord,
+        coords: np.ndarray,
+        segment_indices: np.ndarray,
         map_dimensions: MapDimensions,
-    ) -> Intersection | Literal["inside"] | Literal["outside"]:
+    ) -> List[Intersection | None]:
         """
-        Find intersection of line segment (p1, p2) with map boundary.
+        Find where segments that cross the map boundary intersect it, for all of them at once
+
+        Segment i runs from coords[i] to coords[i + 1]. Each side is intersected parametrically
+        (p1 + t * (p2 - p1) with t in [0, 1]) and when a segment passes through a corner the
+        intersection closest to p1 is kept.
 
         Args:
-            p1: First point of the line segment
-            p2: Second point of the line segment
+            coords: (N, 2) array of a line's lon/lat coordinates
+            segment_indices: Indices of the segments that have exactly one point inside the map
 
         Returns:
-            Intersection | Literal["inside"] (if the segment is entirely inside the map) | Literal["outside"] (if the segment is entirely outside the map)
+            Intersection for each segment, None if no side was found
         """
-        lon1, lat1 = p1
-        lon2, lat2 = p2
-
-        # Check if both points are inside or outside - no intersection in these cases
-        p1_inside = self.is_inside_map(p1, map_dimensions)
-        p2_inside = self.is_inside_map(p2, map_dimensions)
-
-        if p1_inside and p2_inside:
-            return "inside"
-        elif not p1_inside and not p2_inside:
-            return "outside"
-
-        # The line is p1 + t * (p2 - p1) where t is in [0, 1]
-        # Find t for each boundary
-        intersections: List[Intersection] = []
-
-        # Top boundary (lat = max_lat)
-        if lat1 != lat2:  # Avoid division by zero
-            t = (map_dimensions.max_lat - lat1) / (lat2 - lat1)
-            if 0 <= t <= 1:
-                lon_intersect = lon1 + t * (lon2 - lon1)
-                if map_dimensions.min_lon <= lon_intersect <= map_dimensions.max_lon:
-                    intersections.append(
-                        {
-                            "point": (lon_intersect, map_dimensions.max_lat),
-                            "is_entering": lat1 > lat2,  # Entering if moving down
-                            "side": Side.TOP,
-                        }
-                    )
-
-        # Right boundary (lon = max_lon)
-        if lon1 != lon2:
-            t = (map_dimensions.max_lon - lon1) / (lon2 - lon1)
-            if 0 <= t <= 1:
-                lat_intersect = lat1 + t * (lat2 - lat1)
-                if map_dimensions.min_lat <= lat_intersect <= map_dimensions.max_lat:
-                    intersections.append(
-                        {
-                            "point": (map_dimensions.max_lon, lat_intersect),
-                            "is_entering": lon1 > lon2,  # Entering if moving left
-                            "side": Side.RIGHT,
-                        }
-                    )
-
-        # Bottom boundary (lat = min_lat)
-        if lat1 != lat2:
-            t = (map_dimensions.min_lat - lat1) / (lat2 - lat1)
-            if 0 <= t <= 1:
-                lon_intersect = lon1 + t * (lon2 - lon1)
-                if map_dimensions.min_lon <= lon_intersect <= map_dimensions.max_lon:
-                    intersections.append(
-                        {
-                            "point": (lon_intersect, map_dimensions.min_lat),
-                            "is_entering": lat1 < lat2,  # Entering if moving up
-                            "side": Side.BOTTOM,
-                        }
-                    )
-
-        # Left boundary (lon = min_lon)
-        if lon1 != lon2:
-            t = (map_dimensions.min_lon - lon1) / (lon2 - lon1)
-            if 0 <= t <= 1:
-                lat_intersect = lat1 + t * (lat2 - lat1)
-                if map_dimensions.min_lat <= lat_intersect <= map_dimensions.max_lat:
-                    intersections.append(
-                        {
-                            "point": (map_dimensions.min_lon, lat_intersect),
-                            "is_entering": lon1 < lon2,  # Entering if moving right
-                            "side": Side.LEFT,
-                        }
-                    )
-
-        # There should be exactly one intersection unless the line passes through a corner
-        if len(intersections) >= 1:
-            # If we have multiple intersections, take the one closer to p1
-            if len(intersections) > 1:
-                distances = []
-                for intersection in intersections:
-                    dx = intersection["point"][0] - lon1
-                    dy = intersection["point"][1] - lat1
-                    distances.append(dx * dx + dy * dy)
-                return intersections[distances.index(min(distances))]
-            return intersections[0]
+        min_lon = map_dimensions.min_lon
+        max_lon = map_dimensions.max_lon
+        min_lat = map_dimensions.min_lat
+        max_lat = map_dimensions.max_lat
+
+        lon1 = coords[segment_indices, 0]
+        lat1 = coords[segment_indices, 1]
+        lon2 = coords[segment_indices + 1, 0]
+        lat2 = coords[segment_indices + 1, 1]
+        dlon = lon2 - lon1
+        dlat = lat2 - lat1
+
+        # Rows are the sides in the order TOP, RIGHT, BOTTOM, LEFT
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_top = (max_lat - lat1) / dlat
+            t_right = (max_lon - lon1) / dlon
+            t_bottom = (min_lat - lat1) / dlat
+            t_left = (min_lon - lon1) / dlon
+            point_lons = np.stack(
+                (
+                    lon1 + t_top * dlon,
+                    np.full_like(lon1, max_lon),
+                    lon1 + t_bottom * dlon,
+                    np.full_like(lon1, min_lon),
+                )
+            )
+            point_lats = np.stack(
+                (
+                    np.full_like(lat1, max_lat),
+                    lat1 + t_right * dlat,
+                    np.full_like(lat1, min_lat),
+                    lat1 + t_left * dlat,
+                )
+            )
+        ts = np.stack((t_top, t_right, t_bottom, t_left))
+        is_entering = np.stack(
+            (lat1 > lat2, lon1 > lon2, lat1 < lat2, lon1 < lon2)
+        )  # Entering if moving down, left, up, right
+        is_valid = (
+            np.stack((dlat != 0, dlon != 0, dlat != 0, dlon != 0))
+            & (0 <= ts)
+            & (ts <= 1)
+            & (min_lon <= point_lons)
+            & (point_lons <= max_lon)
+            & (min_lat <= point_lats)
+            & (point_lats <= max_lat)
+        )
 
-        raise ValueError("No intersection found for line segment that crosses boundary")
+        # Take the intersection closest to p1, the first side wins ties
+        dx = point_lons - lon1
+        dy = point_lats - lat1
+        distances = np.where(is_valid, dx * dx + dy * dy, np.inf)
+        closest_sides = np.argmin(distances, axis=0)
+        columns = np.arange(len(segment_indices))
+
+        intersections: List[Intersection | None] = []
+        for side_index, point_lon, point_lat, entering, found in zip(
+            closest_sides.tolist(),
+            point_lons[closest_sides, columns].tolist(),
+            point_lats[closest_sides, columns].tolist(),
+            is_entering[closest_sides, columns].tolist(),
+            is_valid.any(axis=0).tolist(),
+        ):
+            intersections.append(
+                Intersection(
+                    point=(point_lon, point_lat),
+                    is_entering=entering,
+                    side=SIDES_CLOCKWISE[side_index],
+                )
+                if found
+                else None
+            )
+        return intersections
 
     def bound_and_sort_complete_coastlines(
         self,
         map_dimensions: MapDimensions,
-    ) -> Tuple[List[Line], Dict[str, Line], IntersectionMap]:
+    ) -> Tuple[List[Line], Dict[int, Line], IntersectionMap]:
         """
         Bound and sort complete coastlines
 
@@ -385,63 +465,110 @@ class CoastlineHandler:
         # These coastlines are closed and don't cross the boundary (and thus we don't need their IDs)
         closed_coastlines: List[Line] = []
         # These coastlines are open and cross the boundary
-        open_coastlines: Dict[str, Line] = {}
+        open_coastlines: Dict[int, Line] = {}
 
-        intersection_map: IntersectionMap = EMPTY_INTERSECTION_MAP.copy()
+        intersection_map: IntersectionMap = create_empty_intersection_map()
+        # The same intersections indexed by bounded coastline id, for renaming merged coastlines
+        intersections_by_coastline_id: Dict[int, List[IntersectionWithId]] = {}
 
         complete_coastlines = self.convert_coastline_ways_into_continuous_lines()
 
         for complete_coastline in tqdm(
-            complete_coastlines, desc="Processing coastlines"
+            complete_coastlines,
+            desc="Processing coastlines",
+            mininterval=0.5,
+            miniters=max(1, len(complete_coastlines) // 100),
         ):
             if len(complete_coastline) < 2:
                 continue
 
             does_coastline_cross_boundary = False
-            # Each of the bounded coastlines that are made from the complete coastline (the str is the bounded coastline id)
-            bounded_coastlines_from_complete_coastline: List[Tuple[str, Line]] = []
+            # Each of the bounded coastlines that are made from the complete coastline (the int is the bounded coastline id)
+            bounded_coastlines_from_complete_coastline: List[Tuple[int, Line]] = []
             # Temporary list to build up coordinates for a single bounded coastline
             bounded_coastline_accumulator: Line = []
             # Unique ID for the current bounded coastline being accumulated
             current_bounded_coastline_id = generate_bounded_coastline_id()
 
-            for [p1, p2] in zip(complete_coastline, complete_coastline[1:]):
-                intersection = self.find_segment_intersection_with_boundary(
-                    p1, p2, map_dimensions
+            coords = np.asarray(complete_coastline, dtype=np.float64)
+
+            # Lines entirely outside the map are dropped and lines entirely inside it are closed
+            # coastlines, only the others need their segments checked
+            line_bbox = (*coords.min(axis=0).tolist(), *coords.max(axis=0).tolist())
+            if not bboxes_intersect(line_bbox, map_dimensions.bbox):
+                continue
+            if bbox_contains(map_dimensions.bbox, line_bbox):
+                closed_coastlines.append(list(complete_coastline))
+                continue
+
+            segment_positions = self.classify_segments(coords, map_dimensions)
+            crossings = iter(
+                self.find_boundary_crossings(
+                    coords,
+                    np.flatnonzero(segment_positions == SEGMENT_CROSSING),
+                    map_dimensions,
                 )
+            )
+
+            # Walk the line in runs of segments with the same position, runs inside the map
+            # are copied into the accumulator as one slice
+            run_starts = [0, *(np.flatnonzero(np.diff(segment_positions)) + 1).tolist()]
+            run_ends = [*run_starts[1:], len(segment_positions)]
 
-                if intersection == "inside":
+            for run_start, run_end in zip(run_starts, run_ends):
+                segment_position = segment_positions[run_start]
+
+                if segment_position == SEGMENT_INSIDE:
                     if not bounded_coastline_accumulator:
                         # If we're starting a new coastline, add the first point
-                        bounded_coastline_accumulator.append(p1)
-                    bounded_coastline_accumulator.append(p2)
+                        bounded_coastline_accumulator.extend(
+                            complete_coastline[run_start : run_end + 1]
+                        )
+                    else:
+                        bounded_coastline_accumulator.extend(
+                            complete_coastline[run_start + 1 : run_end + 1]
+                        )
+                    continue
 
-                elif intersection == "outside":
+                if segment_position == SEGMENT_OUTSIDE:
                     if bounded_coastline_accumulator:
                         raise ValueError(
                             f"Coastline accumulator is not empty but we're outside the map"
                         )
-                else:
+                    continue
+
+                # Only segments crossing the boundary have an intersection
+                for segment_index in range(run_start, run_end):
+                    p1 = complete_coastline[segment_index]
+                    p2 = complete_coastline[segment_index + 1]
+                    intersection = next(crossings)
+                    if intersection is None:
+                        raise ValueError(
+                            "No intersection found for line segment that crosses boundary"
+                        )
+
                     # The coastline has crossed the map boundary
                     does_coastline_cross_boundary = True
 
-                    intersection_map[intersection["side"]].append(
-                        {
-                            "point": intersection["point"],
-                            "is_entering": intersection["is_entering"],
-                            "side": intersection["side"],
-                            "bounded_coastline_id": current_bounded_coastline_id,
-                        }
+                    intersection_with_id = IntersectionWithId(
+                        point=intersection.point,
+                        is_entering=intersection.is_entering,
+                        side=intersection.side,
+                        bounded_coastline_id=current_bounded_coastline_id,
                     )
+                    intersection_map[intersection.side].append(intersection_with_id)
+                    intersections_by_coastline_id.setdefault(
+                        current_bounded_coastline_id, []
+                    ).append(intersection_with_id)
 
-                    if intersection["is_entering"]:
+                    if intersection.is_entering:
                         # Start a new bounded coastline
-                        bounded_coastline_accumulator = [intersection["point"], p2]
+                        bounded_coastline_accumulator = [intersection.point, p2]
                     else:  # coastline is exiting the map
                         if not bounded_coastline_accumulator:
                             # If we're starting a new coastline, add the first point
                             bounded_coastline_accumulator.append(p1)
-                        bounded_coastline_accumulator.append(intersection["point"])
+                        bounded_coastline_accumulator.append(intersection.point)
 
                         # Store the bounded coastline
                         bounded_coastlines_from_complete_coastline.append(
@@ -455,7 +582,8 @@ class CoastlineHandler:
                         # Clear the accumulator for the next coastline
                         bounded_coastline_accumulator = []
 
-            # After processing all pairs, save any remaining part of the current bounded coastline
+            # After processing all pairs, save any remaining part of the current bounded coastline.
+            # The accumulator is a new list for every coastline, so it's stored without a copy
             if bounded_coastline_accumulator:
                 if not does_coastline_cross_boundary:
                     if bounded_coastlines_from_complete_coastline:
@@ -464,7 +592,7 @@ class CoastlineHandler:
                         )
 
                     # This means it's a closed coastline as it never crossed the boundary
-                    closed_coastlines.append(bounded_coastline_accumulator.copy())
+                    closed_coastlines.append(bounded_coastline_accumulator)
 
                 # Check if the chain formed a loop by crossing boundaries and re-entering
                 # If the last point of the last bounded coastline is the first point of the first bounded coastline, merge them.
@@ -473,8 +601,9 @@ class CoastlineHandler:
                     first_bounded_coastline_id = (
                         bounded_coastlines_from_complete_coastline[0][0]
                     )
+                    # Slicing and + already build a new list, so it isn't copied first
                     first_bounded_coastline_coords = (
-                        bounded_coastlines_from_complete_coastline[0][1].copy()
+                        bounded_coastlines_from_complete_coastline[0][1]
                     )
                     bounded_coastlines_from_complete_coastline[0] = (
                         first_bounded_coastline_id,
@@ -483,22 +612,21 @@ class CoastlineHandler:
                     )  # Avoid duplicating the connection point
 
                     # Update the bounded coastline id in all intersections that reference the current_bounded_coastline_id
-                    for side in Side:
-                        for intersection in intersection_map[side]:
-                            if (
-                                intersection["bounded_coastline_id"]
-                                == current_bounded_coastline_id
-                            ):
-                                intersection["bounded_coastline_id"] = (
-                                    first_bounded_coastline_id
-                                )
+                    renamed_intersections = intersections_by_coastline_id.pop(
+                        current_bounded_coastline_id, []
+                    )
+                    for intersection in renamed_intersections:
+                        intersection.bounded_coastline_id = first_bounded_coastline_id
+                    intersections_by_coastline_id.setdefault(
+                        first_bounded_coastline_id, []
+                    ).extend(renamed_intersections)
 
                 else:
                     # Otherwise, just add the last bounded coastline as is
                     bounded_coastlines_from_complete_coastline.append(
                         (
                             current_bounded_coastline_id,
-                            bounded_coastline_accumulator.copy(),
+                            bounded_coastline_accumulator,
                         )
                     )
 
@@ -509,10 +637,16 @@ class CoastlineHandler:
                 open_coastlines[bounded_coastline_id] = bounded_coastline
 
         # Sort intersections along each side of the boundary
-        intersection_map[Side.TOP].sort(key=lambda x: x["point"][0])
-        intersection_map[Side.RIGHT].sort(key=lambda x: x["point"][1], reverse=True)
-        intersection_map[Side.BOTTOM].sort(key=lambda x: x["point"][0], reverse=True)
-        intersection_map[Side.LEFT].sort(key=lambda x: x["point"][1])
+        # Clockwise: left to right along the top, top to bottom along the right side, etc.
+        for side, axis, reverse in (
+            (Side.TOP, 0, False),
+            (Side.RIGHT, 1, True),
+            (Side.BOTTOM, 0, True),
+            (Side.LEFT, 1, False),
+        ):
+            intersection_map[side] = sort_intersections(
+                intersection_map[side], axis, reverse
+            )
 
         self.validate_intersection_map(intersection_map)
 
@@ -536,7 +670,7 @@ class CoastlineHandler:
 
         for side in Side:
             for intersection in intersection_map[side]:
-                if intersection["is_entering"]:
+                if intersection.is_entering:
                     entering_count += 1
                 else:
                     exiting_count += 1
@@ -563,13 +697,13 @@ class CoastlineHandler:
         """
         for side in Side:
             for intersection_index, intersection in enumerate(intersection_map[side]):
-                if intersection["is_entering"]:
+                if intersection.is_entering:
                     return (side, intersection_index)
         return None
 
     def join_open_coastlines(
         self,
-        open_coastlines: Dict[str, Line],
+        open_coastlines: Dict[int, Line],
         intersection_map: IntersectionMap,
         starting_point: Tuple[Side, int],
         map_dimensions: MapDimensions,
@@ -577,6 +711,9 @@ class CoastlineHandler:
         """
         Joins open coastlines into closed coastlines by rotating around the boundary in a clockwise direction.
 
+        Intersections skipped by a rotation are rotated around afterwards, depth first from a
+        worklist instead of recursing so deeply nested coastlines can't hit the recursion limit.
+
         Args:
             open_coastlines: Dictionary of open coastlines
             intersection_map: Map of intersections for each side of the boundary
@@ -585,29 +722,72 @@ class CoastlineHandler:
         Returns:
             List of closed coastlines
         """
+        new_closed_coastlines: List[Line] = []
+        worklist: List[Tuple[IntersectionMap, Tuple[Side, int]]] = [
+            (intersection_map, starting_point)
+        ]
+        while worklist:
+            current_intersection_map, current_starting_point = worklist.pop()
+            closed_coastlines, skipped_intersections = self.rotate_around_boundary(
+                open_coastlines,
+                current_intersection_map,
+                current_starting_point,
+                map_dimensions,
+            )
+            new_closed_coastlines.extend(closed_coastlines)
+
+            # Pushed in reverse so they're popped in order, each one's own skipped
+            # intersections are handled before the next one like the recursive version did
+            for skipped_intersection_map in reversed(skipped_intersections):
+                skipped_starting_point = self.find_intersection_map_starting_point(
+                    skipped_intersection_map
+                )
+                if skipped_starting_point:
+                    worklist.append((skipped_intersection_map, skipped_starting_point))
+
+        return new_closed_coastlines
+
+    def rotate_around_boundary(
+        self,
+        open_coastlines: Dict[int, Line],
+        intersection_map: IntersectionMap,
+        starting_point: Tuple[Side, int],
+        map_dimensions: MapDimensions,
+    ) -> Tuple[List[Line], List[IntersectionMap]]:
+        """
+        Rotates once around the boundary from the starting point, closing the coastlines it can
+
+        Args:
+            open_coastlines: Dictionary of open coastlines
+            intersection_map: Map of intersections for each side of the boundary
+            starting_point: Tuple of (side, intersection_index) to start from
+
+        Returns:
+            Tuple of (closed coastlines, intersection maps of the nested coastlines that were skipped)
+        """
 
         looking_for: Literal["exit", "enter"] = "exit"
         current_side: Side = starting_point[0]
         current_index: int = starting_point[1]
 
-        starting_coastline_id = intersection_map[current_side][current_index][
-            "bounded_coastline_id"
-        ]
+        starting_coastline_id = intersection_map[current_side][
+            current_index
+        ].bounded_coastline_id
 
         current_open_coastline_accumulator: Line = open_coastlines[
             starting_coastline_id
         ]
 
         # We start with this initialized as we being looking for the exit of the starting coastline
-        exit_id_to_look_for: Optional[str] = starting_coastline_id
-        entrace_id_to_look_for: Optional[str] = None
+        exit_id_to_look_for: Optional[int] = starting_coastline_id
+        entrace_id_to_look_for: Optional[int] = None
 
         new_closed_coastlines: List[Line] = []
 
         # These are to handle a special case where 3+ coastlines are nested within eachother (the land would need to look like the rist peninsula)
         skipped_intersections: List[IntersectionMap] = []
         current_skipped_intersection_map: IntersectionMap = (
-            EMPTY_INTERSECTION_MAP.copy()
+            create_empty_intersection_map()
         )
         current_skipped_intersection_map_is_used: bool = False
 
@@ -627,9 +807,9 @@ class CoastlineHandler:
                 continue
 
             current_intersection = intersection_map[current_side][current_index]
-            current_intersection_coastline_id = current_intersection[
-                "bounded_coastline_id"
-            ]
+            current_intersection_coastline_id = (
+                current_intersection.bounded_coastline_id
+            )
             current_intersection_coastline = open_coastlines.get(
                 current_intersection_coastline_id
             )
@@ -640,7 +820,7 @@ class CoastlineHandler:
                 )
 
             if looking_for == "exit":
-                if current_intersection["is_entering"]:
+                if current_intersection.is_entering:
                     raise ValueError(
                         "Invalid intersection map, found entering intersection when looking for exit"
                     )
@@ -677,7 +857,7 @@ class CoastlineHandler:
                         )
 
             elif looking_for == "enter":
-                if not current_intersection["is_entering"]:
+                if not current_intersection.is_entering:
                     raise ValueError(
                         "Invalid intersection map, found exiting intersection when looking for enter"
                     )
@@ -693,7 +873,9 @@ class CoastlineHandler:
                     entrace_id_to_look_for = None
                     if current_skipped_intersection_map_is_used:
                         skipped_intersections.append(current_skipped_intersection_map)
-                        current_skipped_intersection_map = EMPTY_INTERSECTION_MAP.copy()
+                        current_skipped_intersection_map = (
+                            create_empty_intersection_map()
+                        )
                     looking_for = "exit"
                     current_index += 1
                     continue
@@ -705,18 +887,4 @@ class CoastlineHandler:
                     current_index += 1
                     continue
 
-        # Process any skipped intersections recursively
-        for skipped_intersection_map in skipped_intersections:
-            skipped_starting_point = self.find_intersection_map_starting_point(
-                skipped_intersection_map
-            )
-            if skipped_starting_point:
-                skipped_new_closed_coastlines = self.join_open_coastlines(
-                    open_coastlines,
-                    skipped_intersection_map,
-                    skipped_starting_point,
-                    map_dimensions,
-                )
-                new_closed_coastlines.extend(skipped_new_closed_coastlines)
-
-        return new_closed_coastlines
+        return new_closed_coastlines, skipped_intersections
@@ -1,12 +1,9 @@
 from src.rendering import FeatureRenderer, FeaturePolygonData, PolygonStyle
-from src.transforms import transform_relation_to_rings_and_holes
+from src.transforms import transform_relation_to_rings_and_holes, coords_to_array
 
 from reportlab.lib.colors import Color
-from shapely.geometry import Polygon, MultiPolygon
 from osmium import osm
-from reportlab.pdfgen import canvas
 from typing import List, Tuple, Dict
-from src.map_dimensions import MapDimensions
 
 PARK_STYLE: PolygonStyle = {
     "fill_color": Color(0.698, 0.792, 0.682),  # Main park green
@@ -16,105 +13,76 @@ PARK_INTERIOR_STYLE: PolygonStyle = {
     "fill_color": Color(0.8, 0.9, 0.8),  # Lighter green for inner areas
 }
 
+PARK_LEISURE_VALUES = frozenset(
+    ("park", "garden", "playground", "pitch", "sports_centre", "golf_course")
+)
+PARK_LANDUSE_VALUES = frozenset(
+    (
+        "park",
+        "grass",
+        "recreation_ground",
+        "village_green",
+        "meadow",
+        "cemetery",
+        "forest",
+    )
+)
+# Relations also count farmland and orchards as parks
+PARK_RELATION_LANDUSE_VALUES = PARK_LANDUSE_VALUES | frozenset(
+    ("wood", "orchard", "vineyard", "farm", "farmyard")
+)
+PARK_NATURAL_VALUES = frozenset(("wood", "forest"))
+
 
 class ParksHandler:
+    parks: List[FeaturePolygonData]
+
     def __init__(self):
         super().__init__()
-        if not hasattr(self, "parks"):
-            self.parks: List[FeaturePolygonData] = []
+        self.parks = []
 
     def process_way_park(self, way: osm.Way, coords: List[Tuple[float, float]]) -> bool:
         """Process a way to possibly add it to the park list"""
+        tags = way.tags
         if (
-            way.tags.get("leisure")
-            in [
-                "park",
-                "garden",
-                "playground",
-                "pitch",
-                "sports_centre",
-                "golf_course",
-            ]
-            or way.tags.get("landuse")
-            in [
-                "park",
-                "grass",
-                "recreation_ground",
-                "village_green",
-                "meadow",
-                "cemetery",
-                "forest",
-            ]
-            or way.tags.get("natural")
-            in [
-                "wood",
-                "forest",
-            ]
+            tags.get("leisure") in PARK_LEISURE_VALUES
+            or tags.get("landuse") in PARK_LANDUSE_VALUES
+            or tags.get("natural") in PARK_NATURAL_VALUES
         ):
             self.parks.append(
-                {
-                    "type": "park_polygon",
-                    "exterior": coords,
-                    "interiors": [],
-                    "name": way.tags.get("name"),
-                    "relation_id": None,
-                }
+                FeaturePolygonData(
+                    type="park_polygon",
+                    exterior=coords_to_array(coords),
+                    interiors=[],
+                    name=tags.get("name"),
+                    relation_id=None,
+                )
             )
             return True
 
         return False
 
-    def relation_tag_is_park(self, tag: osm.Tag) -> bool:
-        """Check if relation is a park"""
-        return (tag.k == "leisure" or tag.k == "landuse") and tag.v == "park"
-
     def process_relation_park(
         self, relation: osm.Relation, way_coords: Dict[int, List[Tuple[float, float]]]
     ) -> bool:
         """Process a relation to possibly add it to the building list"""
+        tags = relation.tags
         if (
-            relation.tags.get("leisure")
-            in [
-                "park",
-                "garden",
-                "playground",
-                "pitch",
-                "sports_centre",
-                "golf_course",
-            ]
-            or relation.tags.get("landuse")
-            in [
-                "park",
-                "grass",
-                "recreation_ground",
-                "village_green",
-                "meadow",
-                "cemetery",
-                "forest",
-                "wood",
-                "orchard",
-                "vineyard",
-                "farm",
-                "farmyard",
-                "farmyard",
-            ]
-            or relation.tags.get("natural")
-            in [
-                "wood",
-                "forest",
-            ]
+            tags.get("leisure") in PARK_LEISURE_VALUES
+            or tags.get("landuse") in PARK_RELATION_LANDUSE_VALUES
+            or tags.get("natural") in PARK_NATURAL_VALUES
         ):
             for ring, holes in transform_relation_to_rings_and_holes(
                 relation, way_coords
             ):
                 self.parks.append(
-                    {
-                        "type": "park_polygon",
-                        "exterior": ring,
-                        "interiors": holes,
-                        "name": relation.tags.get("name"),
-                        "relation_id": relation.id,
-                    }
+                    FeaturePolygonData(
+                        type="park_polygon",
+                        exterior=coords_to_array(ring),
+                        interiors=[coords_to_array(hole) for hole in holes],
+                        name=tags.get("name"),
+                        relation_id=relation.id,
+                    )
                 )
             return True
 
@@ -128,22 +96,19 @@ class ParksHandler:
         relation_id: int,
     ) -> None:
         self.parks.append(
-            {
-                "type": "park_polygon",
-                "exterior": ring,
-                "interiors": holes,
-                "name": relation_name,
-                "relation_id": relation_id,
-            }
+            FeaturePolygonData(
+                type="park_polygon",
+                exterior=coords_to_array(ring),
+                interiors=[coords_to_array(hole) for hole in holes],
+                name=relation_name,
+                relation_id=relation_id,
+            )
         )
 
     def render_parks(
         self,
-        c: canvas.Canvas,
-        map_dimensions: MapDimensions,
-        boundary: Polygon | MultiPolygon | None,
+        renderer: FeatureRenderer,
     ) -> None:
-        renderer = FeatureRenderer(c, map_dimensions, boundary)
         renderer.render_polygon_features(
             features=self.parks, style=PARK_STYLE, desc="Rendering parks"
         )
@@ -151,17 +116,17 @@ class ParksHandler:
         # Park interiors should be slightly lighter than the main park color
         all_interior_features: List[FeaturePolygonData] = []
         for park in self.parks:
-            if park.get("interiors"):
+            if park.interiors:
                 all_interior_features.extend(
                     [
-                        {
-                            "type": "park_interior",
-                            "exterior": interior,
-                            "interiors": [],
-                            "name": None,
-                            "relation_id": None,
-                        }
-                        for interior in park["interiors"]
+                        FeaturePolygonData(
+                            type="park_interior",
+                            exterior=interior,
+                            interiors=[],
+                            name=None,
+                            relation_id=None,
+                        )
+                        for interior in park.interiors
                     ]
                 )
 
@@ -5,14 +5,12 @@ from src.rendering import (
     PolygonStyle,
     FeaturePolygonData,
 )
-from src.transforms import transform_relation_to_rings_and_holes
+from src.transforms import transform_relation_to_rings_and_holes, coords_to_array
 
+import numpy as np
 from osmium import osm
 from reportlab.lib.colors import Color
-from reportlab.pdfgen import canvas
-from shapely.geometry import Polygon, MultiPolygon
 from typing import List, Tuple, Dict
-from src.map_dimensions import MapDimensions
 
 BASE_ROAD_WIDTHS = {
     1: 8.0,  # Motorways (typical 4 lanes + shoulders)
@@ -61,39 +59,43 @@ ROAD_TYPES_HIERARCHY = {
     "steps": 8,
 }
 
-DISSALOWED_FOOTWAYS = ["sidewalk", "crossing"]
+DISSALOWED_FOOTWAYS = frozenset(("sidewalk", "crossing"))
 
 PEDESTRIAN_RELATION_STYLES: PolygonStyle = {"fill_color": Color(0.866, 0.866, 0.910)}
 
 
 class RoadHandler:
+    roads: List[FeatureLineData]
+    pedestrian_relations: List[FeaturePolygonData]
+
     def __init__(self):
         super().__init__()
-        if not hasattr(self, "roads"):
-            self.roads: List[FeatureLineData] = []
-            self.pedestrian_relations: List[FeaturePolygonData] = []
+        self.roads = []
+        self.pedestrian_relations = []
 
     def get_road_type_from_way(self, way):
-        if way.tags.get("highway") in ROAD_TYPES_HIERARCHY:
-            return way.tags.get("highway")
-        elif way.tags.get("highway") == "construction":
-            if way.tags.get("construction") in ROAD_TYPES_HIERARCHY:
-                return way.tags.get("construction")
+        highway = way.tags.get("highway")
+        if highway in ROAD_TYPES_HIERARCHY:
+            return highway
+        elif highway == "construction":
+            construction = way.tags.get("construction")
+            if construction in ROAD_TYPES_HIERARCHY:
+                return construction
         return None
 
     def process_way_road(self, way: osm.Way, coords: List[Tuple[float, float]]) -> bool:
         """Process a way to possibly add it to the road list"""
         road_type = self.get_road_type_from_way(way)
-        is_not_sidewalk = way.tags.get("footway") not in DISSALOWED_FOOTWAYS
 
-        if road_type and is_not_sidewalk:
+        # The footway tag only matters for ways that are roads
+        if road_type and way.tags.get("footway") not in DISSALOWED_FOOTWAYS:
             self.roads.append(
-                {
-                    "type": road_type,
-                    "coords": coords,
-                    "way_id": way.id,
-                    "hierarchy": ROAD_TYPES_HIERARCHY[road_type],
-                }
+                FeatureLineData(
+                    type=road_type,
+                    coords=coords_to_array(coords),
+                    way_id=way.id,
+                    hierarchy=ROAD_TYPES_HIERARCHY[road_type],
+                )
             )
             return True
 
@@ -107,13 +109,13 @@ class RoadHandler:
                 relation, way_coords
             ):
                 self.pedestrian_relations.append(
-                    {
-                        "type": "pedestrian_polygon",
-                        "exterior": ring,
-                        "interiors": holes,
-                        "name": relation.tags.get("name"),
-                        "relation_id": relation.id,
-                    }
+                    FeaturePolygonData(
+                        type="pedestrian_polygon",
+                        exterior=coords_to_array(ring),
+                        interiors=[coords_to_array(hole) for hole in holes],
+                        name=relation.tags.get("name"),
+                        relation_id=relation.id,
+                    )
                 )
             return True
 
@@ -121,21 +123,22 @@ class RoadHandler:
 
     def render_roads(
         self,
-        c: canvas.Canvas,
-        map_dimensions: MapDimensions,
-        boundary: Polygon | MultiPolygon | None,
+        renderer: FeatureRenderer,
     ):
         # Sort roads by hierarchy (draw less important roads first)
-        sorted_roads = sorted(
-            self.roads,
-            key=lambda x: x.get("hierarchy", 999) if isinstance(x, dict) else 999,
-            reverse=True,
+        # Hierarchies are small ints, so a stable argsort of the negated values keeps roads of the
+        # same hierarchy in the order they were parsed, like a reversed stable sort
+        hierarchies = np.fromiter(
+            (road.hierarchy for road in self.roads),
+            dtype=np.int8,
+            count=len(self.roads),
         )
+        order = np.argsort(-hierarchies, kind="stable")
+        sorted_roads = [self.roads[i] for i in order.tolist()]
 
-        renderer = FeatureRenderer(c, map_dimensions, boundary)
         renderer.render_line_features(
             features=sorted_roads,
-            style=lambda x: ROAD_STYLES[x.get("hierarchy", DEFAULT_ROAD_STYLE_KEY)],
+            style=lambda x: ROAD_STYLES.get(x.hierarchy, DEFAULT_ROAD_STYLE),
             desc="Rendering roads",
         )
 
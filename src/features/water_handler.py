@@ -5,15 +5,11 @@ from src.rendering import (
     PolygonStyle,
     LineStyle,
 )
-from src.transforms import transform_relation_to_rings_and_holes
+from src.transforms import transform_relation_to_rings_and_holes, coords_to_array
 
 from osmium import osm
 from reportlab.lib.colors import Color
-from reportlab.pdfgen import canvas
-from shapely.geometry import Polygon, MultiPolygon
 from typing import List, Tuple, Dict
-from src.map_dimensions import MapDimensions
-
 
 WATER_STYLE: PolygonStyle = {
     "fill_color": Color(0.529, 0.808, 0.922),
@@ -24,67 +20,58 @@ RIVER_STYLE: LineStyle = {
     "stroke_width": 2,
 }
 
+WATER_NATURAL_VALUES = frozenset(("water", "wetland", "spring", "lake"))
+WATER_LEISURE_VALUES = frozenset(("swimming_pool",))
+WATER_AMENITY_VALUES = frozenset(("fountain", "swimming_pool"))
+WATERWAY_VALUES = frozenset(("riverbank", "canal", "river", "stream", "lake", "pond"))
+WATER_VALUES = frozenset(
+    ("lake", "pond", "reservoir", "basin", "river", "canal", "stream", "moat")
+)
+WATER_MAN_MADE_VALUES = frozenset(("reservoir_covered", "reservoir", "lake", "pond"))
+# Waterways drawn as lines rather than filled polygons
+WATERWAY_LINE_VALUES = frozenset(("river", "stream", "canal"))
+
 
 class WaterHandler:
+    water: List[FeaturePolygonData]
+    water_lines: List[FeatureLineData]
+
     def __init__(self):
         super().__init__()
-        if not hasattr(self, "water"):
-            self.water: List[FeaturePolygonData] = []
-            self.water_lines: List[FeatureLineData] = []
+        self.water = []
+        self.water_lines = []
 
     def process_way_water(
         self, way: osm.Way, coords: List[Tuple[float, float]]
     ) -> bool:
         """Process a way to possibly add it to the water list"""
+        tags = way.tags
+        waterway = tags.get("waterway")
         if (
-            way.tags.get("natural") in ["water", "wetland", "spring", "lake"]
-            or way.tags.get("leisure") in ["swimming_pool"]
-            or way.tags.get("amenity") in ["fountain", "swimming_pool"]
-            or way.tags.get("waterway")
-            in [
-                "riverbank",
-                "canal",
-                "river",
-                "stream",
-                "lake",
-                "pond",
-            ]
-            or way.tags.get("water")
-            in [
-                "lake",
-                "pond",
-                "reservoir",
-                "basin",
-                "river",
-                "canal",
-                "stream",
-                "moat",
-            ]
-            or way.tags.get("man_made")
-            in [
-                "reservoir_covered",
-                "reservoir",
-                "lake",
-                "pond",
-            ]
+            tags.get("natural") in WATER_NATURAL_VALUES
+            or tags.get("leisure") in WATER_LEISURE_VALUES
+            or tags.get("amenity") in WATER_AMENITY_VALUES
+            or waterway in WATERWAY_VALUES
+            or tags.get("water") in WATER_VALUES
+            or tags.get("man_made") in WATER_MAN_MADE_VALUES
         ):
-            if way.tags.get("waterway") in ["river", "stream", "canal"]:
+            if waterway in WATERWAY_LINE_VALUES:
                 self.water_lines.append(
-                    {
-                        "type": "waterway",
-                        "coords": coords,
-                        "way_id": way.id,
-                    }
+                    FeatureLineData(
+                        type="waterway",
+                        coords=coords_to_array(coords),
+                        way_id=way.id,
+                    )
                 )
             else:
                 self.water.append(
-                    {
-                        "type": "water_polygon",
-                        "exterior": coords,
-                        "interiors": [],
-                        "relation_id": None,
-                        "name": way.tags.get("name"),
-                    }
+                    FeaturePolygonData(
+                        type="water_polygon",
+                        exterior=coords_to_array(coords),
+                        interiors=[],
+                        name=way.tags.get("name"),
+                        relation_id=None,
+                    )
                 )
             return True
 
@@ -99,19 +86,15 @@ class WaterHandler:
     ) -> None:
         """Add water as a polygon feature"""
         self.water.append(
-            {
-                "type": "water_polygon",
-                "exterior": coords,
-                "interiors": interiors,
-                "relation_id": relation_id,
-                "name": name,
-            }
+            FeaturePolygonData(
+                type="water_polygon",
+                exterior=coords_to_array(coords),
+                interiors=[coords_to_array(interior) for interior in interiors],
+                name=name,
+                relation_id=relation_id,
+            )
         )
 
-    def relation_tag_is_water(self, tag: osm.Tag) -> bool:
-        """Check if relation is a water feature"""
-        return tag.k in ["water", "waterway"]
-
     def process_relation_water(
         self, relation: osm.Relation, way_coords: Dict[int, List[Tuple[float, float]]]
     ) -> bool:
@@ -121,13 +104,13 @@ class WaterHandler:
                 relation, way_coords
             ):
                 self.water.append(
-                    {
-                        "type": "water_polygon",
-                        "exterior": ring,
-                        "interiors": holes,
-                        "name": relation.tags.get("name"),
-                        "relation_id": relation.id,
-                    }
+                    FeaturePolygonData(
+                        type="water_polygon",
+                        exterior=coords_to_array(ring),
+                        interiors=[coords_to_array(hole) for hole in holes],
+                        name=relation.tags.get("name"),
+                        relation_id=relation.id,
+                    )
                 )
             return True
 
@@ -135,13 +118,9 @@ class WaterHandler:
 
     def render_water_features(
         self,
-        c: canvas.Canvas,
-        map_dimensions: MapDimensions,
-        boundary: Polygon | MultiPolygon | None,
+        renderer: FeatureRenderer,
     ) -> None:
         """Render water features"""
-        renderer = FeatureRenderer(c, map_dimensions, boundary)
-
         renderer.render_polygon_features(
             features=self.water,
             style=WATER_STYLE,
@@ -1,4 +1,5 @@
 import math
+import numpy as np
 from enum import Enum, auto
 from typing import Tuple
 from src.scale import (
@@ -7,6 +8,7 @@ from src.scale import (
     EARTH_RADIUS,
 )
 from src.logger import logger
+from src.project_types import BBox
 
 
 class Side(Enum):
@@ -30,6 +32,7 @@ class MapDimensions:
         self.min_lon: float = bottom_left_coord[1]
         self.max_lat: float = top_right_coord[0]
         self.max_lon: float = top_right_coord[1]
+        self.bbox: BBox = (self.min_lon, self.min_lat, self.max_lon, self.max_lat)
 
         self.meters_per_degree_lon_at_avg_lat: float = self.meters_per_degree_lon(
             (self.min_lat + self.max_lat) / 2
@@ -45,6 +48,16 @@ class MapDimensions:
         self.width_points: float = self.width_meters * POINTS_PER_METER
         self.height_points: float = self.height_meters * POINTS_PER_METER
 
+        # Size of one PDF point in degrees, along whichever axis makes it smallest
+        self.pixel_world_size: float = 1 / (
+            max(self.meters_per_degree_lon_at_avg_lat, METERS_PER_DEGREE_LAT)
+            * POINTS_PER_METER
+        )
+
+        # Points per degree of lon/lat, combining the degrees to meters and meters to points scales
+        self._sx: float = self.meters_per_degree_lon_at_avg_lat * POINTS_PER_METER
+        self._sy: float = METERS_PER_DEGREE_LAT * POINTS_PER_METER
+
         self.side_clockwise_corners = {
             Side.TOP: (self.max_lon, self.max_lat),  # top right
             Side.RIGHT: (self.max_lon, self.min_lat),  # bottom right
@@ -60,11 +73,19 @@ class MapDimensions:
         )
 
     def transform_coords(self, lon, lat):
-        # Convert lon/lat to meters from origin
-        x_meters = (lon - self.min_lon) * self.meters_per_degree_lon_at_avg_lat
-        y_meters = (lat - self.min_lat) * METERS_PER_DEGREE_LAT
-        # Convert meters to points
-        return (x_meters * POINTS_PER_METER, y_meters * POINTS_PER_METER)
+        # Convert lon/lat to points from origin
+        return ((lon - self.min_lon) * self._sx, (lat - self.min_lat) * self._sy)
+
+    def transform_coords_batch(
+        self, coords: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Same transform as transform_coords for a whole (N, 2) array of lon/lat coordinates
+
+        Returns:
+            Tuple of (xs, ys) arrays in points
+        """
+        return self.transform_coords(coords[:, 0], coords[:, 1])
 
     def meters_per_degree_lon(self, lat):
         """Calculate meters per degree of longitude at a given latitude"""
@@ -4,11 +4,50 @@ from src.features.parks_handler import ParksHandler
 from src.features.building_handler import BuildingHandler
 from src.features.water_handler import WaterHandler
 
-from osmium import osm, SimpleHandler
-from typing import Set, Dict, List, Tuple
+import numpy as np
+from osmium import osm, SimpleHandler, FileProcessor, InvalidLocationError
+from osmium.geom import WKBFactory, use_nodes
+from typing import Dict, List, Set, Tuple
 from shapely.geometry import Polygon, MultiPolygon
 from src.transforms import transform_relation_to_rings_and_holes
 from src.logger import logger
+from src.project_types import BBox, Coord
+
+# Number of elements processed between progress bar updates
+PROGRESS_BATCH_SIZE = 1024
+
+# Builds way geometries in osmium's C++ code, see way_node_coords
+WKB_FACTORY = WKBFactory()
+
+# Bits of the feature handlers that may claim an element
+BUILDING = 1
+ROAD = 2
+WATER = 4
+PARK = 8
+COASTLINE = 16
+
+# Tag keys each feature handler looks at, an element without any of them is skipped by that handler
+WAY_TAG_FEATURES: Dict[str, int] = {
+    "building": BUILDING,
+    "highway": ROAD,
+    "natural": WATER | PARK | COASTLINE,
+    "leisure": WATER | PARK,
+    "amenity": WATER,
+    "waterway": WATER,
+    "water": WATER,
+    "man_made": WATER,
+    "landuse": PARK,
+}
+
+RELATION_TAG_FEATURES: Dict[str, int] = {
+    "building": BUILDING,
+    "water": WATER,
+    "waterway": WATER,
+    "leisure": PARK,
+    "landuse": PARK,
+    "natural": PARK,
+    "highway": ROAD,
+}
 
 
 class OSMHandler(
@@ -19,115 +58,96 @@ class OSMHandler(
     BuildingHandler,
     WaterHandler,
 ):
-    def __init__(self, boundary_relation_id: int | None = None):
+    def __init__(
+        self, boundary_relation_id: int | None = None, bbox: BBox | None = None
+    ):
         logger.info("Initializing OSMHandler")
         super().__init__()
-        self.pass_num = 1  # Track which pass we're on
-        self.needed_nodes: Set[int | str] = set()
-        self.nodes: Dict[int, Tuple[float, float]] = (
-            {}
-        )  # Will only store needed nodes in second pass
+        # Features entirely outside of this bbox are dropped while parsing
+        self.bbox: BBox | None = bbox
         self.way_coords: Dict[int, List[Tuple[float, float]]] = (
             {}
         )  # Store way coordinates for relations
+        # Ways whose coordinates are kept for relations, filled by collect_relation_way_ids from apply_file
+        self.relation_way_ids: Set[int] | None = None
 
         self.boundary_relation_id: int | None = boundary_relation_id
         self.boundary_polygon: MultiPolygon | None = None
 
-        if not hasattr(self, "progress"):
-            self.progress = None
-
-    def node(self, n):
-        if self.progress:
-            self.progress.update()
-
-        if self.pass_num == 2 and n.id in self.needed_nodes:
-            self.nodes[n.id] = (n.location.lon, n.location.lat)
+        self.progress = None
+        self.pending_progress: int = 0
 
     def way(self, w: osm.Way):
-        if self.progress:
-            self.progress.update()
-
-        if len(w.nodes) > 0:
-            # Store way coordinates for relations in second pass
-            if self.pass_num == 2:
-                coords = []
-                for node in w.nodes:
-                    if node.ref in self.nodes:
-                        coords.append(self.nodes[node.ref])
-                if coords:
-                    self.way_coords[w.id] = coords
-
-            if self.pass_num == 1:
-                for node in w.nodes:
-                    self.needed_nodes.add(node.ref)
-
-            elif self.pass_num == 2:
-                # Second pass: process ways as before
-                coords = []
-                for node in w.nodes:
-                    if node.ref in self.nodes:
-                        coords.append(self.nodes[node.ref])
-                if coords:
-                    if (
-                        # If a way is identified as a feature the logic will short circuit and not check the rest
-                        # This is generally sorted by the frequency of the feature in the data so that the performs the most likely checks first
-                        self.process_way_building(w, coords)
-                        or self.process_way_road(w, coords)
-                        or self.process_way_water(w, coords)
-                        or self.process_way_park(w, coords)
-                        or self.process_way_coastline(w, coords)
-                    ):
-                        pass
-
-    def relation(self, r: osm.Relation):
-        # Update progress if needed
-        if self.progress:
-            self.progress.update()
-
-        # In first pass, collect nodes for water and park relations
-        if self.pass_num == 1:
-            is_needed = False
-
-            # First check for type=multipolygon
-            for tag in r.tags:
-                if tag.k == "type" and tag.v == "multipolygon":
-                    is_needed = True
-                    break
-
-            # Then check other tags if not already needed
-            if not is_needed:
-                for tag in r.tags:
-                    if self.relation_tag_is_water(tag):
-                        is_needed = True
-                    elif self.relation_tag_is_park(tag):
-                        is_needed = True
-                    elif self.relation_tag_is_building(tag):
-                        is_needed = True
-
-            if is_needed:
-                # Collect all member way IDs
-                for member in r.members:
-                    if member.type == "w":
-                        # Store the way ID and collect all its nodes
-                        way_id = f"relation_{r.id}_{member.ref}"
-                        self.needed_nodes.add(way_id)
-                        # Also add the way itself to needed nodes
-                        self.needed_nodes.add(member.ref)
-
-        # In second pass, process water, park, and building relations
-        elif self.pass_num == 2:
-            if r.id == self.boundary_relation_id:
-                self.store_boundary_polygon(r, self.way_coords)
-
+        self.pending_progress += 1
+        if self.pending_progress == PROGRESS_BATCH_SIZE:
+            self.flush_progress()
+
+        # Node locations are resolved by osmium's location index (apply_file with locations=True)
+        coords = way_node_coords(w)
+        if coords:
+            # Store way coordinates for relations, relations come after ways in the file
+            if self.relation_way_ids is None or w.id in self.relation_way_ids:
+                self.way_coords[w.id] = list(coords)
+
+            features = classify_tags(w.tags, WAY_TAG_FEATURES)
             if (
-                self.process_relation_building(r, self.way_coords)
-                or self.process_relation_water(r, self.way_coords)
-                or self.process_relation_park(r, self.way_coords)
-                or self.process_relation_pedestrian(r, self.way_coords)
+                # If a way is identified as a feature the logic will short circuit and not check the rest
+                # This is generally sorted by the frequency of the feature in the data so that the performs the most likely checks first
+                # Handlers are only asked about ways that carry one of the tags they look at
+                (features & BUILDING and self.process_way_building(w, coords))
+                or (features & ROAD and self.process_way_road(w, coords))
+                or (features & WATER and self.process_way_water(w, coords))
+                or (features & PARK and self.process_way_park(w, coords))
+                or (features & COASTLINE and self.process_way_coastline(w, coords))
             ):
                 pass
 
+    def relation(self, r: osm.Relation):
+        self.pending_progress += 1
+        if self.pending_progress == PROGRESS_BATCH_SIZE:
+            self.flush_progress()
+
+        if r.id == self.boundary_relation_id:
+            self.store_boundary_polygon(r, self.way_coords)
+
+        features = classify_tags(r.tags, RELATION_TAG_FEATURES)
+        if (
+            (features & BUILDING and self.process_relation_building(r, self.way_coords))
+            or (features & WATER and self.process_relation_water(r, self.way_coords))
+            or (features & PARK and self.process_relation_park(r, self.way_coords))
+            or (
+                features & ROAD and self.process_relation_pedestrian(r, self.way_coords)
+            )
+        ):
+            pass
+
+    def apply_file(self, filename, *args, **kwargs):
+        """Parse a file, after a quick look at its relations to know which ways they will need"""
+        if self.relation_way_ids is None:
+            self.collect_relation_way_ids(filename)
+        super().apply_file(filename, *args, **kwargs)
+
+    def collect_relation_way_ids(self, pbf_file: str) -> None:
+        """
+        Read the relations of a file to find the ways their members need, apply_file calls it first
+
+        Only relations are decoded so this is quick, and most ways then don't have to keep a
+        copy of their coordinates around until the relations are processed.
+        """
+        way_ids: Set[int] = set()
+        for r in FileProcessor(pbf_file, osm.RELATION):
+            if r.id == self.boundary_relation_id or classify_tags(
+                r.tags, RELATION_TAG_FEATURES
+            ):
+                way_ids.update(member.ref for member in r.members if member.type == "w")
+        self.relation_way_ids = way_ids
+
+    def flush_progress(self):
+        """Add the elements processed since the last update to the progress bar, call again once parsing is done"""
+        if self.progress is not None:
+            self.progress.update(self.pending_progress)
+        self.pending_progress = 0
+
     def store_boundary_polygon(
         self, relation: osm.Relation, way_coords: Dict[int, List[Tuple[float, float]]]
     ):
@@ -141,9 +161,6 @@ class OSMHandler(
         )
 
     def get_boundary_polygon(self) -> MultiPolygon | None:
-        if self.pass_num < 2:
-            raise ValueError("Boundary polygon not available until after second pass")
-
         if not self.boundary_relation_id:
             return None
 
@@ -151,3 +168,27 @@ class OSMHandler(
             raise ValueError("Boundary polygon not found in dataset")
 
         return self.boundary_polygon
+
+
+def classify_tags(tags: osm.TagList, tag_features: Dict[str, int]) -> int:
+    """Bitmask of the feature handlers interested in an element, from a single pass over the watched keys"""
+    # Membership tests stay in osmium's C++ code, iterating the tags would create a Python object per tag
+    features = 0
+    for key, key_features in tag_features.items():
+        if key in tags:
+            features |= key_features
+    return features
+
+
+def way_node_coords(w: osm.Way) -> List[Coord]:
+    """(lon, lat) of every node of a way with a valid location"""
+    try:
+        # One C++ call serializes all the node locations, instead of a Python object per node
+        wkb = bytes.fromhex(WKB_FACTORY.create_linestring(w, use_nodes.ALL))
+    except (InvalidLocationError, RuntimeError):
+        # Ways with a node missing from the file or with fewer than two nodes
+        return [(n.lon, n.lat) for n in w.nodes if n.location.valid()]
+
+    # Little endian WKB linestring: byte order, type and point count, then the x y doubles
+    values = np.frombuffer(wkb, dtype="<f8", offset=9)
+    return list(zip(values[0::2].tolist(), values[1::2].tolist()))
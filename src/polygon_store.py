@@ -0,0 +1,176 @@
+import numpy as np
+import shapely
+from array import array
+from shapely import STRtree
+from shapely.geometry.base import BaseGeometry
+from typing import List, Sequence, Tuple
+
+from src.project_types import Coord
+
+# OSM stores coordinates as integers of 1e-7 degrees, so they fit exactly in int32 fixed point
+COORDINATE_PRECISION = 10_000_000
+
+
+class PolygonStore:
+    """
+    Polygons stored as flat coordinate buffers (struct of arrays) instead of a list of dicts
+
+    Ring `r` spans `xs[ring_offsets[r]:ring_offsets[r + 1]]` (same for `ys`) and polygon `p`
+    owns rings `poly_ring_offsets[p]:poly_ring_offsets[p + 1]`, the first of which is the exterior.
+    Polygons are appended to growable int32 fixed point buffers while parsing (half the size of
+    float64) and converted back to degrees in numpy arrays by `finalize`.
+    """
+
+    def __init__(self):
+        self._xs = array("i")
+        self._ys = array("i")
+        self._ring_offsets = array("i", [0])
+        self._poly_ring_offsets = array("i", [0])
+        self._names: List[str | None] = []
+        self._relation_ids: List[int | None] = []
+
+        self.xs: np.ndarray = np.empty(0, dtype=np.float64)
+        self.ys: np.ndarray = np.empty(0, dtype=np.float64)
+        self.ring_offsets: np.ndarray = np.zeros(1, dtype=np.int32)
+        self.poly_ring_offsets: np.ndarray = np.zeros(1, dtype=np.int32)
+        self.names: np.ndarray = np.empty(0, dtype=object)
+        self.relation_ids: np.ndarray = np.empty(0, dtype=object)
+
+        self._exteriors: np.ndarray | None = None
+        self._tree: STRtree | None = None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(
+        self,
+        exterior: Sequence[Coord],
+        interiors: Sequence[Sequence[Coord]] = (),
+        name: str | None = None,
+        relation_id: int | None = None,
+    ) -> None:
+        """Append a polygon made of an exterior ring and optional interior rings (holes)"""
+        for ring in (exterior, *interiors):
+            if len(ring) > 0:
+                xs, ys = zip(*ring)
+                self._xs.extend([round(x * COORDINATE_PRECISION) for x in xs])
+                self._ys.extend([round(y * COORDINATE_PRECISION) for y in ys])
+            self._ring_offsets.append(len(self._xs))
+
+        self._poly_ring_offsets.append(len(self._ring_offsets) - 1)
+        self._names.append(name)
+        self._relation_ids.append(relation_id)
+
+    def finalize(self) -> None:
+        """Copy the growable buffers into the numpy arrays, call once all polygons have been added"""
+        # Dividing gives back exactly the doubles osmium computed from the same integers
+        self.xs = np.array(self._xs, dtype=np.float64) / COORDINATE_PRECISION
+        self.ys = np.array(self._ys, dtype=np.float64) / COORDINATE_PRECISION
+        self.ring_offsets = np.array(self._ring_offsets, dtype=np.int32)
+        self.poly_ring_offsets = np.array(self._poly_ring_offsets, dtype=np.int32)
+        self.names = np.array(self._names, dtype=object)
+        self.relation_ids = np.array(self._relation_ids, dtype=object)
+        self._exteriors = None
+        self._tree = None
+
+    def ring(self, ring_index: int) -> np.ndarray:
+        """Coordinates of a ring as an (N, 2) array"""
+        start = self.ring_offsets[ring_index]
+        end = self.ring_offsets[ring_index + 1]
+        return np.column_stack((self.xs[start:end], self.ys[start:end]))
+
+    def polygon_rings(self, polygon_index: int) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """Exterior and interior rings of a polygon"""
+        first_ring = self.poly_ring_offsets[polygon_index]
+        last_ring = self.poly_ring_offsets[polygon_index + 1]
+        return self.ring(first_ring), [
+            self.ring(ring_index) for ring_index in range(first_ring + 1, last_ring)
+        ]
+
+    def vertex_indices(self, polygon_indices: Sequence[int] | np.ndarray) -> np.ndarray:
+        """Indices into `xs`/`ys` of every vertex of the given polygons"""
+        polygon_indices = np.asarray(polygon_indices, dtype=np.int64)
+        return self._ranges_to_indices(
+            self.ring_offsets[self.poly_ring_offsets[polygon_indices]],
+            self.ring_offsets[self.poly_ring_offsets[polygon_indices + 1]],
+        )
+
+    def _ranges_to_indices(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Indices into `xs`/`ys` covered by non overlapping [start, end) ranges"""
+        # Mark where each range starts and stops, the running sum is then non zero inside them
+        edges = np.zeros(len(self.xs) + 1, dtype=np.int64)
+        np.add.at(edges, starts, 1)
+        np.add.at(edges, ends, -1)
+        return np.flatnonzero(np.cumsum(edges[:-1]))
+
+    def exterior_polygons(self) -> np.ndarray:
+        """
+        Polygon of each polygon's exterior ring, built with one vectorized call on first use
+
+        Returns:
+            Object array with a Polygon per polygon, or None where the exterior isn't a valid ring
+        """
+        if self._exteriors is not None:
+            return self._exteriors
+
+        exterior_rings = self.poly_ring_offsets[:-1]
+        starts = self.ring_offsets[exterior_rings]
+        ends = self.ring_offsets[exterior_rings + 1]
+        lengths = ends - starts
+
+        # Once closed a ring needs at least 4 points, the same rule Polygon applies
+        last = np.maximum(ends - 1, 0)
+        safe_starts = np.minimum(starts, last)
+        is_closed = (lengths > 0) & (
+            (self.xs[safe_starts] == self.xs[last])
+            & (self.ys[safe_starts] == self.ys[last])
+        )
+        valid = np.flatnonzero((lengths >= 3) & (lengths + ~is_closed >= 4))
+
+        exteriors = np.full(len(self), None, dtype=object)
+        if len(valid) > 0:
+            vertices = self._ranges_to_indices(starts[valid], ends[valid])
+            rings = shapely.linearrings(
+                np.column_stack((self.xs[vertices], self.ys[vertices])),
+                indices=np.repeat(np.arange(len(valid)), lengths[valid]),
+            )
+            exteriors[valid] = shapely.polygons(rings)
+
+        self._exteriors = exteriors
+        return exteriors
+
+    def polygon_bounds(self) -> np.ndarray:
+        """
+        Bounds of every polygon
+
+        Returns:
+            (N, 4) array of (min_x, min_y, max_x, max_y) per polygon
+        """
+        if len(self) == 0 or len(self.xs) == 0:
+            return np.empty((len(self), 4), dtype=np.float64)
+
+        # Each polygon's vertices are contiguous, starting at its exterior ring
+        starts = self.ring_offsets[self.poly_ring_offsets[:-1]]
+        starts = np.minimum(starts, len(self.xs) - 1)
+        return np.column_stack(
+            (
+                np.minimum.reduceat(self.xs, starts),
+                np.minimum.reduceat(self.ys, starts),
+                np.maximum.reduceat(self.xs, starts),
+                np.maximum.reduceat(self.ys, starts),
+            )
+        )
+
+    def query(self, geometry: BaseGeometry) -> np.ndarray:
+        """
+        Find the polygons whose exterior intersects a geometry
+
+        The spatial index over the exteriors is built on the first query and reused afterwards.
+
+        Returns:
+            Sorted indices of the matching polygons
+        """
+        if self._tree is None:
+            self._tree = STRtree(self.exterior_polygons())
+
+        return np.sort(self._tree.query(geometry, predicate="intersects"))
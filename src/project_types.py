@@ -4,6 +4,7 @@ Lon = float
 Lat = float
 Coord = Tuple[Lon, Lat]
 Line = List[Coord]
+BBox = Tuple[Lon, Lat, Lon, Lat]  # (min_lon, min_lat, max_lon, max_lat)
 
 PdfPoint = Tuple[float, float]
 
@@ -1,15 +1,25 @@
 from src.scale import POINTS_PER_METER
 from src.logger import logger
 from tqdm import tqdm
+import numpy as np
+import shapely
 from shapely.geometry import (
     MultiPolygon,
     Polygon,
-    LineString,
 )
 from reportlab.lib.colors import Color
 from reportlab.pdfgen import canvas, pathobject
-from typing import Callable, Tuple, Union, List, TypedDict, NotRequired
+from reportlab.pdfgen.canvas import FILL_NON_ZERO
+from shapely.errors import GEOSException
+from dataclasses import dataclass
+from typing import Callable, Tuple, Union, List, Sequence, TypedDict, NotRequired
 from src.map_dimensions import MapDimensions
+from src.polygon_store import PolygonStore
+from src.project_types import BBox
+from src.transforms import bbox_contains, clip_ring_to_rect
+
+# Most features drawn by a single fill or stroke operator, keeps each path a manageable size
+PATH_BATCH_SIZE = 200
 
 
 class PolygonStyle(TypedDict):
@@ -22,20 +32,46 @@ class LineStyle(TypedDict):
     round_cap: NotRequired[bool]
 
 
-class FeaturePolygonData(TypedDict):
+@dataclass(slots=True, frozen=True)
+class FeaturePolygonData:
     type: str
-    exterior: List[Tuple[float, float]]
-    interiors: List[List[Tuple[float, float]]]
+    exterior: np.ndarray  # (N, 2) lon/lat
+    interiors: List[np.ndarray]
 
     name: str | None
     relation_id: int | None
 
 
-class FeatureLineData(TypedDict):
+@dataclass(slots=True, frozen=True)
+class FeatureLineData:
     type: str
-    coords: List[Tuple[float, float]]
+    coords: np.ndarray  # (N, 2) lon/lat
     way_id: int
-    hierarchy: NotRequired[int]  # Used by road features to store importance level
+    hierarchy: int | None = None  # Used by road features to store importance level
+
+
+class BulkPathObject(pathobject.PDFPathObject):
+    """PDFPathObject that takes whole rings of preformatted points instead of one call per vertex"""
+
+    def addRing(self, points: Sequence[str], is_closed: bool = True) -> None:
+        """
+        Add a closed subpath through points already formatted as "x y" (see format_pdf_points)
+
+        Args:
+            points: Formatted points of the ring
+            is_closed: Whether the ring already ends on its first point, otherwise a line back to it is added
+        """
+        self.addLine(points)
+        if not is_closed:
+            self._code.append(f"{points[0]} l")
+        self.close()
+
+    def addLine(self, points: Sequence[str]) -> None:
+        """Add an open subpath through points already formatted as "x y" (see format_pdf_points)"""
+        self._code_append(f"{points[0]} m")
+        if len(points) > 1:
+            # One string for all the line operators, getCode joins the operators with spaces anyway
+            self._code_append(" l ".join(points[1:]) + " l")
 
 
 class FeatureRenderer:
@@ -46,8 +82,15 @@ class FeatureRenderer:
         boundary: Polygon | MultiPolygon | None,
     ):
         self.canvas = canvas
-        self.transform_coords = map_dimensions.transform_coords
+        self.map_dimensions = map_dimensions
         self.boundary = boundary
+        self.boundary_bbox: BBox | None = boundary.bounds if boundary else None
+        self.page_rect: BBox = (
+            0.0,
+            0.0,
+            map_dimensions.width_points,
+            map_dimensions.height_points,
+        )
 
     def render_line_features(
         self,
@@ -55,44 +98,172 @@ class FeatureRenderer:
         style: Union[LineStyle, Callable[[FeatureLineData], LineStyle]],
         desc: str = "Drawing line features",
     ) -> None:
-        """Render a list of line features with the specified style"""
-        for feature in tqdm(features, desc=desc):
+        """
+        Render a list of line features with the specified style
+
+        Consecutive features with the same style are stroked together as subpaths of one path,
+        up to PATH_BATCH_SIZE at a time, and the stroke state is only set when the style changes.
+        """
+        if self.boundary:
+            lines = self._feature_geometries(
+                [feature.coords for feature in features], closed=False
+            )
+            visible = self._in_boundary(lines)
+        else:
+            # Without a boundary no geometry is needed, only enough points for a line
+            visible = np.fromiter(
+                (len(feature.coords) >= 2 for feature in features),
+                dtype=bool,
+                count=len(features),
+            )
+
+        visible_features = [
+            feature
+            for feature, is_visible in zip(features, visible.tolist())
+            if is_visible
+        ]
+        points, ends = self._format_feature_coords(
+            [feature.coords for feature in visible_features]
+        )
+
+        p = BulkPathObject()
+        path_style: LineStyle | None = None
+        stroked_style: LineStyle | None = None
+        batched = 0
+        start = 0
+        for feature, end in zip(tqdm(visible_features, desc=desc), ends):
+            feature_points = points[start:end]
+            start = end
             try:
                 feature_style: LineStyle = (
                     style if not callable(style) else style(feature)
                 )
-                self._render_line_feature(feature, feature_style)
             except Exception as e:
                 logger.warning(f"Failed to render line feature: {e}")
+                continue
+
+            if batched and (
+                feature_style is not path_style or batched == PATH_BATCH_SIZE
+            ):
+                self._stroke_path(p, path_style, path_style is not stroked_style)
+                stroked_style = path_style
+                p = BulkPathObject()
+                batched = 0
+            p.addLine(feature_points)
+            path_style = feature_style
+            batched += 1
+
+        if batched:
+            self._stroke_path(p, path_style, path_style is not stroked_style)
+
+    def _format_feature_coords(
+        self, coords: Sequence[np.ndarray]
+    ) -> Tuple[List[str], List[int]]:
+        """
+        Transform and format the coordinates of many features together
 
-    def _render_line_feature(
-        self,
-        feature: FeatureLineData,
-        style: LineStyle,
-    ) -> None:
-        """Render a line feature"""
-        coords = feature["coords"]
-        if len(coords) < 2:
-            return
+        Numpy's per call overhead outweighs the work on the few vertices of a single feature, so the
+        vertices of every feature are transformed and formatted in one go.
 
-        feature_line = LineString(coords)
-        if self.boundary and not feature_line.intersects(self.boundary):
-            return
+        Args:
+            coords: (N, 2) lon/lat coordinates of each feature
+
+        Returns:
+            Tuple of (points, ends), feature i's points are points[ends[i - 1]:ends[i]]
+        """
+        if not coords:
+            return [], []
+
+        xs, ys = self.map_dimensions.transform_coords_batch(np.concatenate(coords))
+        ends = np.cumsum([len(feature_coords) for feature_coords in coords])
+        return format_pdf_points(xs, ys), ends.tolist()
+
+    def _feature_geometries(
+        self, coords: Sequence[np.ndarray], closed: bool
+    ) -> np.ndarray:
+        """
+        Geometries of some features, all built with one vectorized call
+
+        Args:
+            coords: (N, 2) lon/lat coordinates of each line, or of each polygon's exterior
+            closed: Build polygons, which need the coordinates to form a valid ring, otherwise lines of at least 2 points
+
+        Returns:
+            Object array with a LineString or Polygon per feature, None where the coordinates don't form one
+        """
+        geometries = np.full(len(coords), None, dtype=object)
+        lengths = np.fromiter(
+            (len(feature_coords) for feature_coords in coords),
+            dtype=np.int64,
+            count=len(coords),
+        )
+        if lengths.sum() == 0:
+            return geometries
+
+        flat = np.concatenate(coords)
+        if closed:
+            # Same rule as create_polygon_from_coords, once closed a ring needs at least 4 points
+            ends = np.cumsum(lengths)
+            last = np.maximum(ends - 1, 0)
+            safe_starts = np.minimum(ends - lengths, last)
+            is_closed = (lengths > 0) & np.all(flat[safe_starts] == flat[last], axis=1)
+            valid = (lengths >= 3) & (lengths + ~is_closed >= 4)
+        else:
+            valid = lengths >= 2
+
+        if valid.any():
+            valid_coords = flat[np.repeat(valid, lengths)]
+            indices = np.repeat(np.arange(np.count_nonzero(valid)), lengths[valid])
+            if closed:
+                geometries[valid] = shapely.polygons(
+                    shapely.linearrings(valid_coords, indices=indices)
+                )
+            else:
+                geometries[valid] = shapely.linestrings(valid_coords, indices=indices)
+        return geometries
+
+    def _in_boundary(
+        self, geometries: np.ndarray, clip_to_boundary: bool = True
+    ) -> np.ndarray:
+        """
+        Find the geometries that touch the boundary, testing all of them in one vectorized call
+
+        Args:
+            geometries: Object array of geometries, None where a feature has none
+            clip_to_boundary: Test against the boundary geometry, when False only the boundary's bbox is checked
 
-        p = self.canvas.beginPath()
-        x, y = self.transform_coords(*coords[0])
-        p.moveTo(x, y)
-        for coord in coords[1:]:
-            x, y = self.transform_coords(*coord)
-            p.lineTo(x, y)
-
-        self.canvas.setStrokeColor(style["stroke_color"])
-        self.canvas.setLineWidth(
-            style["stroke_width"] * POINTS_PER_METER
-        )  # Stroke width 1=1m, 10=10m
-        if style.get("round_cap", False):
-            self.canvas.setLineCap(1)
-            self.canvas.setLineJoin(1)
+        Returns:
+            Boolean mask over the geometries, always False where there is no geometry
+        """
+        if not self.boundary or not self.boundary_bbox:
+            return ~shapely.is_missing(geometries)
+
+        if clip_to_boundary:
+            # The boundary goes first so a prepared boundary is used for the test
+            return shapely.intersects(self.boundary, geometries)
+
+        # Missing geometries have NaN bounds, which fail every comparison
+        bounds = shapely.bounds(geometries)
+        min_x, min_y, max_x, max_y = self.boundary_bbox
+        return (
+            (bounds[:, 2] >= min_x)
+            & (bounds[:, 0] <= max_x)
+            & (bounds[:, 3] >= min_y)
+            & (bounds[:, 1] <= max_y)
+        )
+
+    def _stroke_path(
+        self, p: BulkPathObject, style: LineStyle, set_style: bool = True
+    ) -> None:
+        """Stroke a path of line features, set_style is False when the canvas already uses the style"""
+        if set_style:
+            self.canvas.setStrokeColor(style["stroke_color"])
+            self.canvas.setLineWidth(
+                style["stroke_width"] * POINTS_PER_METER
+            )  # Stroke width 1=1m, 10=10m
+            if style.get("round_cap", False):
+                self.canvas.setLineCap(1)
+                self.canvas.setLineJoin(1)
 
         self.canvas.drawPath(p, fill=0, stroke=1)
 
@@ -101,50 +272,226 @@ class FeatureRenderer:
         features: List[FeaturePolygonData],
         style: PolygonStyle,
         desc: str = "Drawing features",
+        clip_to_boundary: bool = True,
     ) -> None:
         """
         Render a list of geographic features with the same style
 
         Args:
-            features: List of feature dictionaries
+            features: List of features
             style: Dictionary containing rendering style
             desc: Description for progress bar
+            clip_to_boundary: Test each feature against the boundary geometry, when False only the boundary's bbox is checked
         """
-
-        for feature in tqdm(features, desc=desc):
+        # Features are filled together as subpaths of one path, up to PATH_BATCH_SIZE at a time.
+        # Rings are oriented (exteriors counterclockwise, holes clockwise) and filled with the
+        # nonzero winding rule, so overlapping features don't cancel out like with even-odd
+        exteriors = self._feature_geometries(
+            [feature.exterior for feature in features], closed=True
+        )
+        visible = self._in_boundary(exteriors, clip_to_boundary)
+
+        p = BulkPathObject()
+        batched = 0
+        style_is_set = False
+        for feature, exterior_poly, is_visible in zip(
+            tqdm(features, desc=desc), exteriors.tolist(), visible.tolist()
+        ):
+            if not is_visible:
+                continue
             try:
-                self._render_polygon_feature(feature, style)
-            except Exception as e:
+                polygon = self._build_polygon(exterior_poly, feature.interiors)
+                self._draw_polygon_to_path(p, polygon)
+            except (GEOSException, ValueError) as e:
                 logger.warning(f"Failed to render feature: {e}")
+                continue
 
-    def _render_polygon_feature(
+            batched += 1
+            if batched == PATH_BATCH_SIZE:
+                self._fill_path(p, style, not style_is_set)
+                style_is_set = True
+                p = BulkPathObject()
+                batched = 0
+
+        if batched:
+            self._fill_path(p, style, not style_is_set)
+
+    def render_polygon_store(
         self,
-        feature: FeaturePolygonData,
+        store: PolygonStore,
         style: PolygonStyle,
+        desc: str = "Drawing features",
+        indices: Sequence[int] | np.ndarray | None = None,
+        clip_to_boundary: bool = True,
     ) -> None:
         """
-        Render a geographic feature with the specified style
+        Render the polygons of a PolygonStore with the same style
 
         Args:
-            feature: Dictionary containing feature data with 'exterior' and optional 'interiors'
-            style: Dictionary containing rendering style (color, stroke, etc)
+            store: Finalized store of polygons
+            style: Dictionary containing rendering style
+            desc: Description for progress bar
+            indices: Polygons to render, defaults to every polygon in the store
+            clip_to_boundary: Test each polygon against the boundary geometry, when False only the boundary's bbox is checked
+        """
+        indices = np.arange(len(store)) if indices is None else np.asarray(indices)
+        bounds = store.polygon_bounds()
+
+        # Test every polygon against the boundary at once
+        if self.boundary and self.boundary_bbox:
+            if clip_to_boundary:
+                in_boundary = shapely.intersects(
+                    self.boundary, store.exterior_polygons()[indices]
+                )
+            else:
+                min_x, min_y, max_x, max_y = self.boundary_bbox
+                candidate_bounds = bounds[indices]
+                in_boundary = (
+                    (candidate_bounds[:, 2] >= min_x)
+                    & (candidate_bounds[:, 0] <= max_x)
+                    & (candidate_bounds[:, 3] >= min_y)
+                    & (candidate_bounds[:, 1] <= max_y)
+                )
+            indices = indices[in_boundary]
+
+        # Transform every vertex of the store to PDF points at once, then format the
+        # vertices of the polygons being rendered as PDF operands in one go
+        point_xs, point_ys = self.map_dimensions.transform_coords(store.xs, store.ys)
+        vertex_indices = store.vertex_indices(indices)
+        formatted_points = np.empty(len(point_xs), dtype=object)
+        formatted_points[vertex_indices] = format_pdf_points(
+            point_xs[vertex_indices], point_ys[vertex_indices]
+        )
+        points: List[str] = formatted_points.tolist()
+
+        # Polygons are batched and oriented like in render_polygon_features, so overlapping
+        # buildings don't cancel out under the nonzero fill
+        is_ccw: List[bool] = rings_are_ccw(
+            store.xs, store.ys, store.ring_offsets
+        ).tolist()
+
+        p = BulkPathObject()
+        batched = 0
+        style_is_set = False
+        for polygon_index in tqdm(indices.tolist(), desc=desc):
+            try:
+                rings = self._store_polygon_rings(
+                    store,
+                    polygon_index,
+                    tuple(bounds[polygon_index].tolist()),
+                    point_xs,
+                    point_ys,
+                    points,
+                    is_ccw,
+                )
+            except Exception as e:
+                logger.warning(f"Failed to render feature: {e}")
+                continue
+            if not rings:
+                continue
+
+            for ring_points, is_closed in rings:
+                p.addRing(ring_points, is_closed)
+            batched += 1
+            if batched == PATH_BATCH_SIZE:
+                self._fill_path(p, style, not style_is_set)
+                style_is_set = True
+                p = BulkPathObject()
+                batched = 0
+
+        if batched:
+            self._fill_path(p, style, not style_is_set)
+
+    def _store_polygon_rings(
+        self,
+        store: PolygonStore,
+        polygon_index: int,
+        polygon_bbox: BBox,
+        point_xs: np.ndarray,
+        point_ys: np.ndarray,
+        points: List[str],
+        is_ccw: List[bool],
+    ) -> List[Tuple[List[str], bool]]:
         """
-        exterior_coords = feature.get("exterior", [])
-        interiors = feature.get("interiors", [])
+        Rings to draw for a polygon of a PolygonStore, already tested against the boundary, from its
+        vertices transformed to PDF points
 
-        # Quick validation - need at least 3 points for a polygon
-        if len(exterior_coords) < 3:
-            return
+        Polygons that cross the edge of the map are clipped to the page so the PDF doesn't carry
+        vertices that can never be seen. The exterior is counterclockwise and holes clockwise.
 
-        # Create exterior polygon
-        exterior_poly = create_polygon_from_coords(exterior_coords)
-        if not exterior_poly:
-            return
+        Args:
+            store: Finalized store of polygons
+            polygon_index: Index of the polygon in the store
+            polygon_bbox: Bounds of the polygon in lon/lat
+            point_xs: X coordinates in PDF points of every vertex in the store
+            point_ys: Y coordinates in PDF points of every vertex in the store
+            points: Every vertex in the store formatted as PDF operands
+            is_ccw: Whether each ring of the store is counterclockwise
+
+        Returns:
+            Formatted points of each ring and whether they already end on the first point, empty if
+            the polygon isn't drawn
+        """
+        ring_offsets = store.ring_offsets
+        first_ring = store.poly_ring_offsets[polygon_index]
+        last_ring = store.poly_ring_offsets[polygon_index + 1]
+
+        # Same validation as create_polygon_from_coords, once closed a ring needs at least 4 points
+        rings: List[Tuple[int, int, bool, bool]] = []
+        for ring_index in range(first_ring, last_ring):
+            start = ring_offsets[ring_index]
+            end = ring_offsets[ring_index + 1]
+            is_closed = end - start > 0 and (
+                store.xs[start] == store.xs[end - 1]
+                and store.ys[start] == store.ys[end - 1]
+            )
+            if end - start >= 3 and (end - start) + (not is_closed) >= 4:
+                # Only the exterior should be counterclockwise
+                reverse = is_ccw[ring_index] != (ring_index == first_ring)
+                rings.append((start, end, is_closed, reverse))
+            elif ring_index == first_ring:
+                return []
+
+        crosses_page_edge = not bbox_contains(self.map_dimensions.bbox, polygon_bbox)
+
+        ring_points: List[Tuple[List[str], bool]] = []
+        for start, end, is_closed, reverse in rings:
+            if not crosses_page_edge:
+                formatted = points[start:end]
+            else:
+                # Clipping keeps the direction of the ring
+                xs, ys = clip_ring_to_rect(
+                    point_xs[start:end].tolist(),
+                    point_ys[start:end].tolist(),
+                    self.page_rect,
+                )
+                if len(xs) < 3:
+                    if start == rings[0][0]:
+                        # The exterior is entirely off the page
+                        return []
+                    continue
+                formatted = format_pdf_points(np.array(xs), np.array(ys))
+                is_closed = True
+            ring_points.append((formatted[::-1] if reverse else formatted, is_closed))
+
+        return ring_points
+
+    def _build_polygon(
+        self,
+        exterior_poly: Polygon,
+        interiors: Sequence[Sequence[Tuple[float, float]] | np.ndarray],
+    ) -> Polygon:
+        """
+        Polygon to draw for an exterior polygon, already tested against the boundary, and interior
+        rings (holes)
 
-        # Check if feature intersects boundary
-        if self.boundary and not exterior_poly.intersects(self.boundary):
-            return
+        Args:
+            exterior_poly: Polygon of the exterior ring
+            interiors: Coordinates of each interior ring
 
+        Returns:
+            The polygon with its holes, or just the exterior if they don't make a valid polygon
+        """
         # If we have interior polygons (holes), handle them together with the exterior
         if interiors:
             # Create a list of interior polygons
@@ -160,64 +507,144 @@ class FeatureRenderer:
                 # Create a polygon with holes using the exterior and interiors
                 try:
                     # Use the exterior and interior rings to create a proper polygon with holes
-                    multi_poly = Polygon(
+                    return Polygon(
                         exterior_poly.exterior.coords,
                         [interior.exterior.coords for interior in interior_polys],
                     )
-                    self._draw_polygon(multi_poly, style)
-                    return
-                except Exception as e:
+                except (GEOSException, ValueError) as e:
                     logger.warning(f"Failed to create polygon with holes: {e}")
                     # Fall back to drawing just the exterior if creating the complex polygon fails
 
         # If we have no interiors or if creating the complex polygon failed, just draw the exterior
-        self._draw_polygon(exterior_poly, style)
-
-    def _draw_polygon(self, polygon: Polygon, style: PolygonStyle) -> None:
-        """Internal method to draw a polygon with the specified style"""
-        p = self.canvas.beginPath()
-        self._draw_polygon_to_path(p, polygon)
+        return exterior_poly
 
-        self.canvas.setFillColor(style["fill_color"])
-        self.canvas.drawPath(p, fill=1, stroke=0)
+    def _fill_path(
+        self, p: BulkPathObject, style: PolygonStyle, set_style: bool = True
+    ) -> None:
+        """Fill a path of oriented polygons, set_style is False when the canvas already uses the style"""
+        if set_style:
+            self.canvas.setFillColor(style["fill_color"])
+        self.canvas.drawPath(p, fill=1, stroke=0, fillMode=FILL_NON_ZERO)
 
     def _draw_polygon_to_path(
         self,
-        p: pathobject.PDFPathObject,
+        p: BulkPathObject,
         polygon: Union[Polygon, MultiPolygon],
     ) -> None:
-        """Draw a polygon to a ReportLab path object"""
-        if isinstance(polygon, MultiPolygon):
-            for geom in polygon.geoms:
-                self._draw_polygon_to_path(p, geom)
+        """
+        Draw a polygon to a ReportLab path object, with its exteriors counterclockwise and its holes
+        clockwise for the nonzero fill
+        """
+        # Exterior then interior rings (holes) of every part, read from GEOS, transformed and
+        # formatted in one go. Shapely rings are already closed
+        coords = shapely.get_coordinates(polygon)
+        if len(coords) == 0:
             return
 
-        # Draw exterior
-        exterior_coords = list(polygon.exterior.coords)
-        x, y = self.transform_coords(*exterior_coords[0])
-        p.moveTo(x, y)
-        for coord in exterior_coords[1:]:
-            x, y = self.transform_coords(*coord)
-            p.lineTo(x, y)
-        p.close()
-
-        # Draw interior rings (holes)
-        for interior in polygon.interiors:
-            interior_coords = list(interior.coords)
-            x, y = self.transform_coords(*interior_coords[0])
-            p.moveTo(x, y)
-            for coord in interior_coords[1:]:
-                x, y = self.transform_coords(*coord)
-                p.lineTo(x, y)
-            p.close()
-
-
-def create_polygon_from_coords(coords: List[Tuple[float, float]]) -> Polygon | None:
+        xs, ys = self.map_dimensions.transform_coords_batch(coords)
+        points = format_pdf_points(xs, ys)
+        if (
+            isinstance(polygon, Polygon)
+            and shapely.get_num_interior_rings(polygon) == 0
+        ):
+            ring_lengths = np.array([len(coords)])
+            is_exterior = np.array([True])
+        else:
+            parts = shapely.get_parts(polygon)
+            ring_lengths = shapely.get_num_coordinates(shapely.get_rings(parts))
+            # Each part's exterior comes first, followed by its holes
+            is_exterior = np.zeros(len(ring_lengths), dtype=bool)
+            rings_per_part = shapely.get_num_interior_rings(parts) + 1
+            is_exterior[np.cumsum(rings_per_part) - rings_per_part] = True
+
+        ring_offsets = np.concatenate(([0], np.cumsum(ring_lengths)))
+        is_ccw = rings_are_ccw(coords[:, 0], coords[:, 1], ring_offsets)
+        for start, end, reverse in zip(
+            ring_offsets[:-1].tolist(),
+            ring_offsets[1:].tolist(),
+            (is_ccw != is_exterior).tolist(),
+        ):
+            ring_points = points[start:end]
+            p.addRing(ring_points[::-1] if reverse else ring_points)
+
+
+# printf formats for 0 to 6 decimals, as used by reportlab's fp_str
+_FP_FORMATS = tuple(f"%.{decimals}f" for decimals in range(7))
+
+
+def format_pdf_numbers(values: np.ndarray) -> List[str]:
+    """Format numbers exactly like reportlab's fp_str, deciding the precision of the whole array at once"""
+    magnitudes = np.abs(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        decimals = np.where(
+            magnitudes <= 1,
+            6,
+            np.clip(6 - np.log10(magnitudes).astype(np.int64), 0, 6),
+        )
+
+    formatted: List[str] = []
+    for value, magnitude, decimal_count in zip(
+        values.tolist(), magnitudes.tolist(), decimals.tolist()
+    ):
+        if magnitude <= 1e-7:
+            formatted.append("0")
+            continue
+        number = _FP_FORMATS[decimal_count] % value
+        if decimal_count:
+            number = number.rstrip("0").rstrip(".")
+        if number[0] == "0" and len(number) > 1:
+            number = number[1:]
+        formatted.append(number)
+    return formatted
+
+
+def rings_are_ccw(
+    xs: np.ndarray, ys: np.ndarray, ring_offsets: np.ndarray
+) -> np.ndarray:
+    """
+    Whether each ring winds counterclockwise, from the sign of its area like shapely's orient
+
+    Args:
+        xs: X coordinates of every ring, back to back
+        ys: Y coordinates of every ring, back to back
+        ring_offsets: Ring r spans xs[ring_offsets[r]:ring_offsets[r + 1]], the last offset is len(xs)
+
+    Returns:
+        Boolean array with a value per ring, False for empty rings
+    """
+    starts = ring_offsets[:-1]
+    lengths = np.diff(ring_offsets)
+    is_ccw = np.zeros(len(lengths), dtype=bool)
+    non_empty = lengths > 0
+    if not non_empty.any():
+        return is_ccw
+
+    # Relative to the first vertex of each ring, so small rings far from the origin keep their precision
+    ring_starts = np.repeat(starts, lengths)
+    dxs = xs - xs[ring_starts]
+    dys = ys - ys[ring_starts]
+
+    # Shoelace formula, each vertex is paired with the next one of its ring, wrapping back to the first
+    following = np.arange(1, len(xs) + 1)
+    following[ring_offsets[1:][non_empty] - 1] = starts[non_empty]
+    cross = dxs * dys[following] - dxs[following] * dys
+    # Rings are back to back, so the sums between the starts of non empty rings are whole rings
+    is_ccw[non_empty] = np.add.reduceat(cross, starts[non_empty]) > 0
+    return is_ccw
+
+
+def format_pdf_points(xs: np.ndarray, ys: np.ndarray) -> List[str]:
+    """Format points as "x y" PDF operands"""
+    return [f"{x} {y}" for x, y in zip(format_pdf_numbers(xs), format_pdf_numbers(ys))]
+
+
+def create_polygon_from_coords(
+    coords: Sequence[Tuple[float, float]] | np.ndarray,
+) -> Polygon | None:
     """Creates a Polygon from a list of coordinates. Returns None if the coordinates do not form a valid polygon."""
     if len(coords) >= 3:
-        if coords[0] != coords[-1]:
-            coords.append(coords[0])
         try:
+            # Polygon closes the ring itself when the first and last coordinates differ
             return Polygon(coords)
         except:
             return None
@@ -1,7 +1,11 @@
+import itertools
+import numpy as np
+from collections import deque
 from osmium import osm
 from shapely.geometry import Polygon, LinearRing, MultiPolygon
-from typing import List, Tuple, Dict, Any
+from typing import Deque, List, Sequence, Tuple, Dict, Any
 from src.logger import logger
+from src.project_types import BBox, Coord
 
 
 def transform_relation_to_rings_and_holes(
@@ -21,43 +25,20 @@ def transform_relation_to_rings_and_holes(
                 inner_rings.append(coords)
 
     if outer_rings:
+        # First, connect outer ring segments that share endpoints
+        connected_rings = connect_ring_segments(outer_rings)
 
-        # First, try to connect outer ring segments that share endpoints
-        connected_rings = []
-
-        while outer_rings:
-            current = outer_rings[0]
-            outer_rings.pop(0)
-            modified = True
-
-            while modified:
-                modified = False
-                i = 0
-                while i < len(outer_rings):
-                    other = outer_rings[i]
-                    if current[-1] == other[0]:
-                        current.extend(other[1:])
-                        outer_rings.pop(i)
-                        modified = True
-                    elif current[-1] == other[-1]:
-                        current.extend(other[-2::-1])
-                        outer_rings.pop(i)
-                        modified = True
-                    elif current[0] == other[-1]:
-                        current = other + current[1:]
-                        outer_rings.pop(i)
-                        modified = True
-                    elif current[0] == other[0]:
-                        current = other[::-1] + current[1:]
-                        outer_rings.pop(i)
-                        modified = True
-                    else:
-                        i += 1
-
-            # Close the ring if needed
-            if current[0] != current[-1]:
-                current.append(current[0])
-            connected_rings.append(current)
+        # Inner rings are closed and built once, instead of once for every outer ring
+        inner_polygons: List[Tuple[List[Tuple[float, float]], Polygon]] = []
+        for inner in inner_rings:
+            if len(inner) >= 3:
+                # Close the inner ring if needed
+                if inner[0] != inner[-1]:
+                    inner = inner + [inner[0]]
+                try:
+                    inner_polygons.append((inner, Polygon(LinearRing(inner))))
+                except Exception as e:
+                    logger.warning(f"Failed to process inner ring: {e}")
 
         # Create polygons from the connected rings
         for ring in connected_rings:
@@ -66,21 +47,194 @@ def transform_relation_to_rings_and_holes(
             ):  # Need at least 4 points for a valid polygon (3 unique + closing point)
                 # Process inner rings
                 holes: List[List[Tuple[float, float]]] = []
-                for inner in inner_rings:
-                    if len(inner) >= 3:
-                        # Close the inner ring if needed
-                        if inner[0] != inner[-1]:
-                            inner = inner + [inner[0]]
-                        try:
-                            inner_ring = LinearRing(inner)
-                            outer_ring = LinearRing(ring)
-                            inner_poly = Polygon(inner_ring)
-                            outer_poly = Polygon(outer_ring)
+                if inner_polygons:
+                    try:
+                        outer_poly = Polygon(LinearRing(ring))
+                        for inner, inner_poly in inner_polygons:
                             if outer_poly.contains(inner_poly):
                                 holes.append(inner)
-                        except Exception as e:
-                            logger.warning(f"Failed to process inner ring: {e}")
+                    except Exception as e:
+                        logger.warning(f"Failed to process inner ring: {e}")
 
                 output.append((ring, holes))
 
     return output
+
+
+def connect_ring_segments(segments: List[List[Coord]]) -> List[List[Coord]]:
+    """
+    Connect line segments that share endpoints into closed rings
+
+    Each ring starts from the first unused segment and takes matching segments in the order a
+    scan over the remaining segments finds them, starting the scan over after a pass that added
+    something. Matches are looked up in an index of segment endpoints rather than compared
+    against every remaining segment, so relations with many members aren't quadratic.
+
+    Args:
+        segments: Coordinates of each segment, they are not modified
+
+    Returns:
+        Closed rings, in the order of their first segment
+    """
+    # Segment positions by endpoint, in increasing order
+    by_endpoint: Dict[Coord, List[int]] = {}
+    for position, segment in enumerate(segments):
+        by_endpoint.setdefault(segment[0], []).append(position)
+        if segment[-1] != segment[0]:
+            by_endpoint.setdefault(segment[-1], []).append(position)
+
+    unused = [True] * len(segments)
+    rings: List[List[Coord]] = []
+    for first in range(len(segments)):
+        if not unused[first]:
+            continue
+        unused[first] = False
+        current: Deque[Coord] = deque(segments[first])
+
+        modified = True
+        while modified:
+            modified = False
+            scan_position = 0
+            while True:
+                # The next unused segment at or after the scan position touching either end
+                candidates = [
+                    position
+                    for position in itertools.chain(
+                        by_endpoint.get(current[-1], ()),
+                        by_endpoint.get(current[0], ()),
+                    )
+                    if unused[position] and position >= scan_position
+                ]
+                if not candidates:
+                    break
+                position = min(candidates)
+                other = segments[position]
+
+                if current[-1] == other[0]:
+                    current.extend(other[1:])
+                elif current[-1] == other[-1]:
+                    current.extend(other[-2::-1])
+                elif current[0] == other[-1]:
+                    current.extendleft(reversed(other[:-1]))
+                else:
+                    current.extendleft(other[1:])
+
+                unused[position] = False
+                modified = True
+                scan_position = position + 1
+
+        ring = list(current)
+        # Close the ring if needed
+        if ring[0] != ring[-1]:
+            ring.append(ring[0])
+        rings.append(ring)
+
+    return rings
+
+
+def coords_to_array(coords: Sequence[Coord]) -> np.ndarray:
+    """Coordinates as an (N, 2) float64 array, 16 bytes per vertex instead of a tuple of floats"""
+    return np.array(coords, dtype=np.float64).reshape(-1, 2)
+
+
+def coords_intersect_bbox(coords: List[Coord], bbox: BBox) -> bool:
+    """Check if the bounding box of a list of coordinates overlaps the given bbox"""
+    if not coords:
+        return False
+
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lons, lats = zip(*coords)
+    return (
+        max(lons) >= min_lon
+        and min(lons) <= max_lon
+        and max(lats) >= min_lat
+        and min(lats) <= max_lat
+    )
+
+
+def relation_members_bbox(
+    relation: osm.Relation, way_coords: Dict[int, List[Coord]]
+) -> BBox | None:
+    """Bbox of all the member ways of a relation, None if none of them have coordinates"""
+    min_lon = min_lat = float("inf")
+    max_lon = max_lat = float("-inf")
+    for member in relation.members:
+        if member.type == "w" and member.ref in way_coords:
+            lons, lats = zip(*way_coords[member.ref])
+            min_lon = min(min_lon, *lons)
+            min_lat = min(min_lat, *lats)
+            max_lon = max(max_lon, *lons)
+            max_lat = max(max_lat, *lats)
+
+    if min_lon > max_lon:
+        return None
+    return (min_lon, min_lat, max_lon, max_lat)
+
+
+def bboxes_intersect(a: BBox, b: BBox) -> bool:
+    """Check if two bboxes overlap"""
+    return a[2] >= b[0] and a[0] <= b[2] and a[3] >= b[1] and a[1] <= b[3]
+
+
+def bbox_contains(outer: BBox, inner: BBox) -> bool:
+    """Check if the outer bbox fully contains the inner bbox"""
+    return (
+        outer[0] <= inner[0]
+        and outer[1] <= inner[1]
+        and outer[2] >= inner[2]
+        and outer[3] >= inner[3]
+    )
+
+
+def _clip_ring_to_half_plane(
+    points: List[Tuple[float, float]], axis: int, limit: float, keep_above: bool
+) -> List[Tuple[float, float]]:
+    """Clip a ring against one edge of a rectangle, keeping the side selected by keep_above"""
+    clipped: List[Tuple[float, float]] = []
+    if not points:
+        return clipped
+
+    previous = points[-1]
+    previous_inside = (previous[axis] >= limit) == keep_above
+    for point in points:
+        inside = (point[axis] >= limit) == keep_above
+        if inside != previous_inside:
+            t = (limit - previous[axis]) / (point[axis] - previous[axis])
+            clipped.append(
+                (
+                    previous[0] + t * (point[0] - previous[0]),
+                    previous[1] + t * (point[1] - previous[1]),
+                )
+            )
+        if inside:
+            clipped.append(point)
+        previous, previous_inside = point, inside
+
+    return clipped
+
+
+def clip_ring_to_rect(
+    xs: Sequence[float], ys: Sequence[float], rect: BBox
+) -> Tuple[List[float], List[float]]:
+    """
+    Clip a ring to an axis aligned rectangle with Sutherland-Hodgman
+
+    Args:
+        xs: X coordinates of the ring
+        ys: Y coordinates of the ring
+        rect: Rectangle as (min_x, min_y, max_x, max_y)
+
+    Returns:
+        Tuple of (xs, ys) of the clipped ring, empty if the ring is entirely outside the rectangle
+    """
+    min_x, min_y, max_x, max_y = rect
+    points = list(zip(xs, ys))
+    points = _clip_ring_to_half_plane(points, 0, min_x, True)
+    points = _clip_ring_to_half_plane(points, 0, max_x, False)
+    points = _clip_ring_to_half_plane(points, 1, min_y, True)
+    points = _clip_ring_to_half_plane(points, 1, max_y, False)
+
+    if not points:
+        return [], []
+    clipped_xs, clipped_ys = zip(*points)
+    return list(clipped_xs), list(clipped_ys)